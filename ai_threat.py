@@ -4,44 +4,275 @@ Implements machine learning models for anomaly detection and threat assessment
 """
 
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 import joblib
 import os
 import json
-from collections import defaultdict, deque
+from collections import deque
+from concurrent.futures import Future
 import threading
 import time
 
+try:
+    import treelite
+    import treelite.gtil
+except ImportError:
+    treelite = None
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """No-op stand-in for numba.njit when numba is not installed"""
+        def decorator(func):
+            return func
+        return decorator
+
+@njit('float64(float64[:])', cache=True)
+def rule_based_score(features):
+    """Rule-based threat score for a 10-element feature vector"""
+    threat_score = 0.0
+    
+    msg_freq = features[0]
+    avg_length = features[1]
+    time_pattern = features[2]
+    length_variance = features[3]
+    response_time = features[4]
+    unique_recipients = features[6]
+    geo_consistency = features[8]
+    device_consistency = features[9]
+    
+    # High message frequency
+    if msg_freq > 20:
+        threat_score += 30
+    
+    # Unusual time patterns (late night/early morning)
+    if time_pattern < 5 or time_pattern > 22:
+        threat_score += 20
+    
+    # Very short or very long messages
+    if avg_length < 10 or avg_length > 500:
+        threat_score += 15
+    
+    # High variance in message lengths
+    if length_variance > 1000:
+        threat_score += 10
+    
+    # Very fast response times (bot-like)
+    if response_time < 1:
+        threat_score += 25
+    
+    # Many unique recipients
+    if unique_recipients > 10:
+        threat_score += 20
+    
+    # Low geographic consistency
+    if geo_consistency < 0.3:
+        threat_score += 15
+    
+    # Low device consistency
+    if device_consistency < 0.5:
+        threat_score += 10
+    
+    return min(100.0, threat_score)
+
+@njit('UniTuple(float64, 3)(int32[:], int8[:], float64[:])', cache=True)
+def activity_metrics(lengths, hours, epochs):
+    """Mean length, hour variance and mean inter-message gap in one pass"""
+    n = lengths.shape[0]
+    sum_len = 0.0
+    sum_hour = 0.0
+    sum_hour_sq = 0.0
+    for k in range(n):
+        sum_len += lengths[k]
+        h = float(hours[k])
+        sum_hour += h
+        sum_hour_sq += h * h
+    
+    mean_hour = sum_hour / n
+    time_variance = max(0.0, sum_hour_sq / n - mean_hour * mean_hour)
+    
+    # Mean of consecutive differences telescopes to (last - first) / (n - 1)
+    avg_gap = (epochs[n - 1] - epochs[0]) / (n - 1) if n > 1 else 0.0
+    
+    return sum_len / n, time_variance, avg_gap
+
+class UserBehaviorStore:
+    """Per-user behavior stats kept as parallel arrays indexed by user slot"""
+    
+    N_LOCK_SHARDS = 64  # power of two so a user hash can be masked into a shard
+    
+    def __init__(self, window: int = 100, capacity: int = 64):
+        self.window = window
+        self.index: Dict[str, int] = {}
+        self.ip_addresses: List[set] = []
+        
+        # Per-user writes take one of N_LOCK_SHARDS locks; slot allocation takes _index_lock
+        self._index_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(self.N_LOCK_SHARDS)]
+        for name, array in self._new_arrays(capacity).items():
+            setattr(self, name, array)
+    
+    def _new_arrays(self, capacity: int) -> Dict[str, np.ndarray]:
+        """Allocate empty per-user arrays for the given number of slots"""
+        return {
+            # Messages currently in the rolling window (capped at window)
+            'message_count': np.zeros(capacity, dtype=np.int64),
+            # Ring buffer of recent message lengths plus running sums
+            'length_buf': np.zeros((capacity, self.window), dtype=np.float64),
+            'length_head': np.zeros(capacity, dtype=np.int64),
+            'sum_len': np.zeros(capacity, dtype=np.float64),
+            'sum_len_sq': np.zeros(capacity, dtype=np.float64),
+            'last_hour': np.full(capacity, -1, dtype=np.int8),
+            # Epoch seconds of the last message, NaN when never seen
+            'last_activity': np.full(capacity, np.nan, dtype=np.float64),
+            'suspicious_count': np.zeros(capacity, dtype=np.int64),
+        }
+    
+    def _grow(self):
+        """Double the slot capacity, preserving existing rows"""
+        # Hold every shard lock so no write lands in an array being replaced
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            used = len(self.index)
+            for name, array in self._new_arrays(2 * len(self.message_count)).items():
+                array[:used] = getattr(self, name)[:used]
+                setattr(self, name, array)
+        finally:
+            for lock in self._locks:
+                lock.release()
+    
+    def lock_for(self, user_id: str) -> threading.Lock:
+        """Return the shard lock guarding a user's row"""
+        return self._locks[hash(user_id) & (self.N_LOCK_SHARDS - 1)]
+    
+    def __len__(self) -> int:
+        return len(self.index)
+    
+    def slot(self, user_id: str, create: bool = True) -> int:
+        """Return the array slot for a user, or -1 if unknown and not created"""
+        i = self.index.get(user_id, -1)
+        if i < 0 and create:
+            with self._index_lock:
+                # Another thread may have allocated the slot while we waited
+                i = self.index.get(user_id, -1)
+                if i < 0:
+                    i = len(self.index)
+                    if i == len(self.message_count):
+                        self._grow()
+                    self.ip_addresses.append(set())
+                    self.index[user_id] = i
+        return i
+    
+    def record(self, user_id: str, message_length: int, timestamp: datetime,
+               now_epoch: Optional[float] = None):
+        """Record a message, evicting the oldest length once the window is full"""
+        # Allocate the slot before taking the shard lock; _grow takes every shard lock
+        i = self.slot(user_id)
+        with self.lock_for(user_id):
+            n = self.message_count[i]
+            head = self.length_head[i]
+            
+            if n == self.window:
+                evicted = self.length_buf[i, head]
+                self.sum_len[i] -= evicted
+                self.sum_len_sq[i] -= evicted * evicted
+            else:
+                self.message_count[i] = n + 1
+            
+            self.length_buf[i, head] = message_length
+            self.length_head[i] = (head + 1) % self.window
+            self.sum_len[i] += message_length
+            self.sum_len_sq[i] += message_length * message_length
+            self.last_hour[i] = timestamp.hour
+            self.last_activity[i] = timestamp.timestamp() if now_epoch is None else now_epoch
+    
+    def mean_length(self, i: int) -> float:
+        """Mean of the user's windowed message lengths"""
+        n = self.message_count[i]
+        return float(self.sum_len[i] / n) if n else 0.0
+    
+    def var_length(self, i: int) -> float:
+        """Population variance of the user's windowed message lengths"""
+        n = self.message_count[i]
+        if not n:
+            return 0.0
+        mean = self.sum_len[i] / n
+        # Clamp tiny negative results caused by floating point cancellation
+        return max(0.0, float(self.sum_len_sq[i] / n - mean * mean))
+
+class CovariancePCA:
+    """PCA via eigendecomposition of the small feature covariance matrix"""
+    
+    def __init__(self, n_components: int = 10):
+        self.n_components = n_components
+        self.mean_ = None
+        self.components_ = None
+        self.explained_variance_ = None
+    
+    def fit(self, X: np.ndarray) -> 'CovariancePCA':
+        """Fit principal axes from the feature covariance matrix"""
+        X = np.asarray(X, dtype=np.float64)
+        n_samples = X.shape[0]
+        self.mean_ = X.mean(axis=0)
+        
+        # Post-hoc covariance (X.T @ X - N * mean mean.T) / (N - 1) avoids
+        # materializing a centered copy of X; NumPy routes X.T @ X to syrk
+        gram = X.T @ X
+        cov = (gram - n_samples * np.outer(self.mean_, self.mean_)) / max(1, n_samples - 1)
+        
+        # eigh on the (features x features) covariance instead of an SVD of X
+        eigvals, eigvecs = np.linalg.eigh(cov)
+        
+        # eigh returns ascending eigenvalues; keep the largest first
+        self.explained_variance_ = eigvals[::-1][:self.n_components]
+        self.components_ = eigvecs[:, ::-1][:, :self.n_components].T
+        return self
+    
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        """Project data onto the principal axes"""
+        return (np.asarray(X, dtype=np.float64) - self.mean_) @ self.components_.T
+    
+    def fit_transform(self, X: np.ndarray) -> np.ndarray:
+        """Fit and project in one call"""
+        return self.fit(X).transform(X)
+
 class ThreatDetector:
     """AI-powered threat detection using machine learning"""
     
     def __init__(self):
         self.model = None
-        self.scaler = StandardScaler()
-        self.pca = PCA(n_components=10)
+        self.scaler = None  # StandardScaler, created when training (sklearn is imported lazily)
+        self.pca = CovariancePCA(n_components=10)
         self.is_trained = False
         self.model_path = 'models/threat_detection_model.pkl'
         self.scaler_path = 'models/scaler.pkl'
         self.pca_path = 'models/pca.pkl'
+        self.projection_path = 'models/projection.npz'
+        
+        # Serving state as one (W, b, model, tl_model) tuple: the fused scaler + PCA projection
+        # (features @ W + b), the forest, and its Treelite copy for fast CPU inference (None when
+        # unavailable). Training replaces it whole, so a score never mixes old and new state
+        self._serving = None
+        self._model_lock = threading.Lock()
         
         # User behavior tracking
-        self.user_behavior = defaultdict(lambda: {
-            'message_frequency': deque(maxlen=100),
-            'message_lengths': deque(maxlen=100),
-            'time_patterns': deque(maxlen=100),
-            'ip_addresses': set(),
-            'last_activity': None,
-            'suspicious_count': 0
-        })
+        self.user_behavior = UserBehaviorStore(window=100)
         
         # Global threat indicators
         self.global_threat_level = 0.0
         self.threat_history = deque(maxlen=1000)
+        self.threat_window = deque(maxlen=10)
+        self._threat_lock = threading.Lock()
+        
+        # Request coalescing for analyze_message_metadata
+        self.score_timeout = 5  # seconds a request waits for its batch before scoring 0
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._pending_event = threading.Event()
+        self._flusher_thread = None
         
         # Load or train model
         self._initialize_model()
@@ -53,19 +284,28 @@ class ThreatDetector:
             os.makedirs('models', exist_ok=True)
             
             # Try to load existing model
-            if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
-                self.model = joblib.load(self.model_path)
-                self.scaler = joblib.load(self.scaler_path)
-                self.pca = joblib.load(self.pca_path)
+            if os.path.exists(self.model_path) and (
+                    os.path.exists(self.projection_path) or os.path.exists(self.scaler_path)):
+                model = joblib.load(self.model_path)
+                W, b = self._load_projection()
+                self.model = model
+                self._serving = (W, b, model, self._build_forest_predictor(model))
                 self.is_trained = True
                 print("Loaded existing threat detection model")
             else:
                 # Train new model with synthetic data
-                self._train_model_with_synthetic_data()
+                self._start_background_training()
                 
         except Exception as e:
             print(f"Error initializing model: {e}")
-            self._train_model_with_synthetic_data()
+            self._start_background_training()
+    
+    def _start_background_training(self):
+        """Train in a daemon thread, serving rule-based scores until the model is ready"""
+        # _train_model_with_synthetic_data only sets is_trained once the model,
+        # projection and forest predictor are all in place
+        self.is_trained = False
+        threading.Thread(target=self._train_model_with_synthetic_data, daemon=True).start()
     
     def _train_model_with_synthetic_data(self):
         """Train the model with synthetic data for initial deployment"""
@@ -78,24 +318,12 @@ class ThreatDetector:
             
             # Combine data
             X = np.vstack([normal_data, anomalous_data])
-            y = np.hstack([np.ones(len(normal_data)), -np.ones(len(anomalous_data))])
-            
-            # Preprocess data
-            X_scaled = self.scaler.fit_transform(X)
-            X_pca = self.pca.fit_transform(X_scaled)
             
-            # Train Isolation Forest
-            self.model = IsolationForest(
-                contamination=0.1,
-                random_state=42,
-                n_estimators=100
-            )
-            self.model.fit(X_pca)
+            # Preprocess data and train Isolation Forest
+            self._fit_and_publish(X)
             
             # Save models
-            joblib.dump(self.model, self.model_path)
-            joblib.dump(self.scaler, self.scaler_path)
-            joblib.dump(self.pca, self.pca_path)
+            self._save_models()
             
             self.is_trained = True
             print("Threat detection model trained successfully")
@@ -107,171 +335,276 @@ class ThreatDetector:
     
     def _generate_normal_behavior_data(self, n_samples: int) -> np.ndarray:
         """Generate synthetic normal behavior data"""
-        np.random.seed(42)
+        rng = np.random.default_rng(42)
         
-        # Normal behavior patterns
-        data = []
-        for _ in range(n_samples):
-            # Message frequency (messages per hour)
-            msg_freq = np.random.normal(5, 2)
-            msg_freq = max(0, msg_freq)
-            
-            # Average message length
-            avg_length = np.random.normal(50, 20)
-            avg_length = max(10, avg_length)
-            
-            # Time pattern (hour of day)
-            time_pattern = np.random.normal(12, 4)
-            time_pattern = max(0, min(23, time_pattern))
-            
-            # Message length variance
-            length_variance = np.random.normal(100, 50)
-            length_variance = max(10, length_variance)
-            
-            # Response time (seconds)
-            response_time = np.random.exponential(30)
-            
-            # Session duration (minutes)
-            session_duration = np.random.normal(30, 15)
-            session_duration = max(5, session_duration)
-            
-            # Number of unique recipients
-            unique_recipients = np.random.poisson(3)
-            unique_recipients = max(1, unique_recipients)
-            
-            # Login frequency (logins per day)
-            login_freq = np.random.normal(2, 1)
-            login_freq = max(0.5, login_freq)
-            
-            # Geographic consistency (simulated)
-            geo_consistency = np.random.normal(0.8, 0.1)
-            geo_consistency = max(0, min(1, geo_consistency))
-            
-            # Device consistency (simulated)
-            device_consistency = np.random.normal(0.9, 0.05)
-            device_consistency = max(0, min(1, device_consistency))
-            
-            data.append([
-                msg_freq, avg_length, time_pattern, length_variance,
-                response_time, session_duration, unique_recipients,
-                login_freq, geo_consistency, device_consistency
-            ])
+        # Message frequency (messages per hour)
+        msg_freq = rng.normal(5, 2, n_samples)
+        np.maximum(msg_freq, 0, out=msg_freq)
+        
+        # Average message length
+        avg_length = rng.normal(50, 20, n_samples)
+        np.maximum(avg_length, 10, out=avg_length)
+        
+        # Time pattern (hour of day)
+        time_pattern = rng.normal(12, 4, n_samples)
+        np.clip(time_pattern, 0, 23, out=time_pattern)
+        
+        # Message length variance
+        length_variance = rng.normal(100, 50, n_samples)
+        np.maximum(length_variance, 10, out=length_variance)
         
-        return np.array(data)
+        # Response time (seconds)
+        response_time = rng.exponential(30, n_samples)
+        
+        # Session duration (minutes)
+        session_duration = rng.normal(30, 15, n_samples)
+        np.maximum(session_duration, 5, out=session_duration)
+        
+        # Number of unique recipients
+        unique_recipients = np.maximum(rng.poisson(3, n_samples), 1)
+        
+        # Login frequency (logins per day)
+        login_freq = rng.normal(2, 1, n_samples)
+        np.maximum(login_freq, 0.5, out=login_freq)
+        
+        # Geographic consistency (simulated)
+        geo_consistency = rng.normal(0.8, 0.1, n_samples)
+        np.clip(geo_consistency, 0, 1, out=geo_consistency)
+        
+        # Device consistency (simulated)
+        device_consistency = rng.normal(0.9, 0.05, n_samples)
+        np.clip(device_consistency, 0, 1, out=device_consistency)
+        
+        return np.column_stack([
+            msg_freq, avg_length, time_pattern, length_variance,
+            response_time, session_duration, unique_recipients,
+            login_freq, geo_consistency, device_consistency
+        ])
     
     def _generate_anomalous_behavior_data(self, n_samples: int) -> np.ndarray:
         """Generate synthetic anomalous behavior data"""
-        np.random.seed(123)
-        
-        data = []
-        for _ in range(n_samples):
-            # Anomalous patterns
-            anomaly_type = np.random.choice(['high_freq', 'unusual_time', 'bot_like', 'suspicious_content'])
-            
-            if anomaly_type == 'high_freq':
-                # Extremely high message frequency
-                msg_freq = np.random.normal(50, 10)
-                avg_length = np.random.normal(20, 5)
-                time_pattern = np.random.normal(12, 2)
-                length_variance = np.random.normal(50, 10)
-                response_time = np.random.exponential(1)
-                session_duration = np.random.normal(5, 2)
-                unique_recipients = np.random.poisson(20)
-                login_freq = np.random.normal(10, 2)
-                geo_consistency = np.random.normal(0.3, 0.1)
-                device_consistency = np.random.normal(0.4, 0.1)
-                
-            elif anomaly_type == 'unusual_time':
-                # Unusual time patterns
-                msg_freq = np.random.normal(2, 1)
-                avg_length = np.random.normal(100, 30)
-                time_pattern = np.random.choice([2, 3, 4, 22, 23])  # Very early/late hours
-                length_variance = np.random.normal(200, 50)
-                response_time = np.random.exponential(300)
-                session_duration = np.random.normal(120, 30)
-                unique_recipients = np.random.poisson(1)
-                login_freq = np.random.normal(0.5, 0.2)
-                geo_consistency = np.random.normal(0.2, 0.1)
-                device_consistency = np.random.normal(0.3, 0.1)
-                
-            elif anomaly_type == 'bot_like':
-                # Bot-like behavior
-                msg_freq = np.random.normal(30, 5)
-                avg_length = np.random.normal(15, 3)
-                time_pattern = np.random.normal(12, 1)
-                length_variance = np.random.normal(10, 2)
-                response_time = np.random.exponential(0.1)
-                session_duration = np.random.normal(2, 0.5)
-                unique_recipients = np.random.poisson(50)
-                login_freq = np.random.normal(20, 5)
-                geo_consistency = np.random.normal(0.1, 0.05)
-                device_consistency = np.random.normal(0.95, 0.02)
-                
-            else:  # suspicious_content
-                # Suspicious content patterns
-                msg_freq = np.random.normal(8, 3)
-                avg_length = np.random.normal(200, 50)
-                time_pattern = np.random.normal(12, 3)
-                length_variance = np.random.normal(500, 100)
-                response_time = np.random.exponential(60)
-                session_duration = np.random.normal(15, 5)
-                unique_recipients = np.random.poisson(2)
-                login_freq = np.random.normal(1, 0.5)
-                geo_consistency = np.random.normal(0.4, 0.2)
-                device_consistency = np.random.normal(0.6, 0.2)
-            
-            # Ensure positive values
-            msg_freq = max(0, msg_freq)
-            avg_length = max(5, avg_length)
-            time_pattern = max(0, min(23, time_pattern))
-            length_variance = max(5, length_variance)
-            response_time = max(0.1, response_time)
-            session_duration = max(1, session_duration)
-            unique_recipients = max(1, unique_recipients)
-            login_freq = max(0.1, login_freq)
-            geo_consistency = max(0, min(1, geo_consistency))
-            device_consistency = max(0, min(1, device_consistency))
-            
-            data.append([
-                msg_freq, avg_length, time_pattern, length_variance,
-                response_time, session_duration, unique_recipients,
-                login_freq, geo_consistency, device_consistency
-            ])
-        
-        return np.array(data)
+        rng = np.random.default_rng(123)
+        
+        # Anomaly archetype per sample:
+        # 0 = high_freq, 1 = unusual_time, 2 = bot_like, 3 = suspicious_content
+        anomaly_type = rng.integers(0, 4, n_samples)
+        
+        def normal(means, stds):
+            # Draw every sample at once using its archetype's parameters
+            return rng.normal(np.take(means, anomaly_type), np.take(stds, anomaly_type))
+        
+        msg_freq = normal([50, 2, 30, 8], [10, 1, 5, 3])
+        avg_length = normal([20, 100, 15, 200], [5, 30, 3, 50])
+        time_pattern = normal([12, 12, 12, 12], [2, 0, 1, 3])
+        length_variance = normal([50, 200, 10, 500], [10, 50, 2, 100])
+        response_time = rng.exponential(np.take([1, 300, 0.1, 60], anomaly_type))
+        session_duration = normal([5, 120, 2, 15], [2, 30, 0.5, 5])
+        unique_recipients = rng.poisson(np.take([20, 1, 50, 2], anomaly_type))
+        login_freq = normal([10, 0.5, 20, 1], [2, 0.2, 5, 0.5])
+        geo_consistency = normal([0.3, 0.2, 0.1, 0.4], [0.1, 0.1, 0.05, 0.2])
+        device_consistency = normal([0.4, 0.3, 0.95, 0.6], [0.1, 0.1, 0.02, 0.2])
+        
+        # Unusual time patterns use very early/late hours
+        unusual_time = anomaly_type == 1
+        time_pattern[unusual_time] = rng.choice([2, 3, 4, 22, 23], np.count_nonzero(unusual_time))
+        
+        # Ensure positive values
+        np.maximum(msg_freq, 0, out=msg_freq)
+        np.maximum(avg_length, 5, out=avg_length)
+        np.clip(time_pattern, 0, 23, out=time_pattern)
+        np.maximum(length_variance, 5, out=length_variance)
+        np.maximum(response_time, 0.1, out=response_time)
+        np.maximum(session_duration, 1, out=session_duration)
+        unique_recipients = np.maximum(unique_recipients, 1)
+        np.maximum(login_freq, 0.1, out=login_freq)
+        np.clip(geo_consistency, 0, 1, out=geo_consistency)
+        np.clip(device_consistency, 0, 1, out=device_consistency)
+        
+        return np.column_stack([
+            msg_freq, avg_length, time_pattern, length_variance,
+            response_time, session_duration, unique_recipients,
+            login_freq, geo_consistency, device_consistency
+        ])
+    
+    def _save_models(self):
+        """Persist model, scaler, PCA and fused projection without compression"""
+        with self._model_lock:
+            model, scaler, pca = self.model, self.scaler, self.pca
+            W, b = self._serving[:2]
+        
+        # Protocol 5 hands numpy buffers to joblib out-of-band instead of copying them
+        joblib.dump(model, self.model_path, compress=0, protocol=5)
+        joblib.dump(scaler, self.scaler_path, compress=0, protocol=5)
+        joblib.dump(pca, self.pca_path, compress=0, protocol=5)
+        
+        # The serving path only needs the fused projection
+        np.savez(self.projection_path, W=W, b=b)
+    
+    def _load_projection(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Load the fused projection, deriving it from scaler/PCA pickles for older model dirs"""
+        if os.path.exists(self.projection_path):
+            with np.load(self.projection_path) as projection:
+                return projection['W'], projection['b']
+        
+        self.scaler = joblib.load(self.scaler_path)
+        self.pca = joblib.load(self.pca_path)
+        return self._build_projection(self.scaler, self.pca)
+    
+    def _create_isolation_forest(self):
+        """Create the anomaly detection forest, building trees on all CPU cores"""
+        from sklearn.ensemble import IsolationForest
+        
+        # n_jobs only parallelizes fit; scoring stays sequential regardless.
+        # 50 trees on 256-row subsamples (Liu et al.) halve per-message traversal
+        return IsolationForest(
+            n_estimators=50,
+            max_samples=256,
+            max_features=1.0,
+            bootstrap=False,
+            contamination=0.1,
+            random_state=42,
+            n_jobs=-1
+        )
+    
+    def _fit_and_publish(self, X: np.ndarray):
+        """Fit a fresh scaler, PCA and forest on X, then make them the serving state in one swap"""
+        from sklearn.preprocessing import StandardScaler
+        
+        # Everything is built in locals; scoring sees the old state until the final assignment
+        scaler = StandardScaler()
+        pca = CovariancePCA(n_components=self.pca.n_components)
+        X_pca = pca.fit_transform(scaler.fit_transform(X))
+        model = self._create_isolation_forest()
+        model.fit(X_pca)
+        W, b = self._build_projection(scaler, pca)
+        tl_model = self._build_forest_predictor(model)
+        
+        with self._model_lock:
+            self.scaler, self.pca, self.model = scaler, pca, model
+            self._serving = (W, b, model, tl_model)
+    
+    def _build_projection(self, scaler, pca: CovariancePCA) -> Tuple[np.ndarray, np.ndarray]:
+        """Fold a fitted scaler and PCA into a single affine projection"""
+        # ((X - mean) / scale - pca_mean) @ C.T == X @ (C / scale).T + b
+        components = pca.components_
+        inv_scale = 1.0 / scaler.scale_
+        W = np.ascontiguousarray((components * inv_scale).T)
+        b = -(scaler.mean_ * inv_scale + pca.mean_) @ components.T
+        return W, b
+    
+    def _build_forest_predictor(self, model):
+        """Import a fitted forest into Treelite so inference skips sklearn's per-tree dispatch"""
+        if treelite is None:
+            return None
+        try:
+            return treelite.sklearn.import_model(model)
+        except Exception as e:
+            print(f"Treelite import failed, using sklearn inference: {e}")
+            return None
+    
+    def _decision_function(self, features_pca: np.ndarray, serving: Tuple) -> np.ndarray:
+        """IsolationForest decision_function, served by Treelite when available"""
+        _, _, model, tl_model = serving
+        if tl_model is None:
+            return model.decision_function(features_pca)
+        
+        # Treelite yields -score_samples; shift by offset_ to match decision_function
+        raw = treelite.gtil.predict(tl_model, features_pca, nthread=1)
+        return -np.ravel(raw) - model.offset_
+    
+    def _project(self, features: np.ndarray, serving: Tuple) -> np.ndarray:
+        """Project raw feature rows into PCA space with one matmul"""
+        W, b = serving[:2]
+        projected = np.asarray(features, dtype=np.float64) @ W
+        projected += b
+        return projected
     
     def analyze_message_metadata(self, sender_id: str, recipient_id: str, 
                                message_length: int, timestamp: datetime) -> float:
-        """Analyze message metadata for threat detection"""
+        """Analyze message metadata for threat detection, batched with concurrent requests"""
+        try:
+            # Views run on worker threads, so each can block on its share of a batch
+            future = self.submit_message_metadata(sender_id, recipient_id, message_length, timestamp)
+            return future.result(self.score_timeout)
+            
+        except Exception as e:
+            print(f"Error analyzing message metadata: {e}")
+            return 0.0
+    
+    def analyze_messages_batch(self, messages: List[Tuple[str, str, int, datetime]]) -> np.ndarray:
+        """Analyze a batch of (sender_id, recipient_id, message_length, timestamp) tuples"""
         try:
-            # Update user behavior tracking
-            self._update_user_behavior(sender_id, message_length, timestamp)
+            if not messages:
+                return np.zeros(0)
             
-            # Extract features
-            features = self._extract_features(sender_id, recipient_id, message_length, timestamp)
+            # Update behavior and extract features in arrival order
+            features = []
+            for sender_id, recipient_id, message_length, timestamp in messages:
+                now_epoch = timestamp.timestamp()
+                self._update_user_behavior(sender_id, message_length, timestamp, now_epoch)
+                features.append(self._extract_features(
+                    sender_id, recipient_id, message_length, timestamp, now_epoch
+                ))
             
             if not self.is_trained:
-                # Fallback to rule-based detection
-                return self._rule_based_threat_score(features)
-            
-            # Use ML model for prediction
-            features_scaled = self.scaler.transform([features])
-            features_pca = self.pca.transform(features_scaled)
+                return np.array([self._rule_based_threat_score(f) for f in features])
             
-            # Get anomaly score
-            anomaly_score = self.model.decision_function(features_pca)[0]
+            # Single projection and a single forest traversal for the whole batch,
+            # against one snapshot of the serving state
+            serving = self._serving
+            features_pca = self._project(features, serving)
+            anomaly_scores = self._decision_function(features_pca, serving)
             
-            # Convert to threat score (0-100)
-            threat_score = max(0, min(100, (1 - anomaly_score) * 50))
+            # threat = clip((1 - anomaly) * 50, 0, 100), computed in place
+            threat_scores = np.subtract(1, anomaly_scores, out=anomaly_scores)
+            threat_scores *= 50
+            np.clip(threat_scores, 0, 100, out=threat_scores)
             
-            # Update global threat level
-            self._update_global_threat_level(threat_score)
+            for threat_score in threat_scores:
+                self._update_global_threat_level(threat_score)
             
-            return threat_score
+            return threat_scores
             
         except Exception as e:
-            print(f"Error analyzing message metadata: {e}")
-            return 0.0
+            print(f"Error analyzing message batch: {e}")
+            return np.zeros(len(messages))
+    
+    def submit_message_metadata(self, sender_id: str, recipient_id: str, 
+                                message_length: int, timestamp: datetime) -> Future:
+        """Queue message metadata for batched scoring; the future resolves to a threat score"""
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((future, (sender_id, recipient_id, message_length, timestamp)))
+            if self._flusher_thread is None:
+                self._flusher_thread = threading.Thread(target=self._run_batch_flusher, daemon=True)
+                self._flusher_thread.start()
+        self._pending_event.set()
+        return future
+    
+    def _run_batch_flusher(self):
+        """Score queued messages in batches so one forest traversal covers many requests"""
+        while True:
+            self._pending_event.wait()
+            
+            # No fixed wait: a lone message is scored at once, and whatever queues
+            # while a batch is being scored becomes the next batch
+            with self._pending_lock:
+                batch, self._pending = self._pending, []
+                self._pending_event.clear()
+            
+            if not batch:
+                continue
+            
+            futures, messages = zip(*batch)
+            try:
+                threat_scores = self.analyze_messages_batch(list(messages))
+            except Exception as e:
+                # Fail this batch's callers rather than leave them waiting out their timeout
+                for future in futures:
+                    future.set_exception(e)
+                continue
+            for future, threat_score in zip(futures, threat_scores):
+                future.set_result(float(threat_score))
     
     def analyze_user_activity(self, user_id: str, messages: List[Dict]) -> float:
         """Analyze overall user activity for threat assessment"""
@@ -279,24 +612,26 @@ class ThreatDetector:
             if not messages:
                 return 0.0
             
-            # Calculate activity metrics
+            # Single pass over the messages into contiguous buffers
             total_messages = len(messages)
-            avg_message_length = np.mean([len(msg.get('content', '')) for msg in messages])
-            
-            # Time analysis
-            timestamps = [msg.get('timestamp', datetime.utcnow()) for msg in messages]
-            time_variance = np.var([ts.hour for ts in timestamps if isinstance(ts, datetime)])
+            lengths = np.empty(total_messages, dtype=np.int32)
+            hours = np.empty(total_messages, dtype=np.int8)
+            epochs = np.empty(total_messages, dtype=np.float64)
+            recipients = set()
+            now = datetime.utcnow()
+            
+            for k, msg in enumerate(messages):
+                lengths[k] = msg.get('content_length', 0)
+                recipients.add(msg.get('recipient_id'))
+                timestamp = msg.get('timestamp', now)
+                hours[k] = timestamp.hour
+                epochs[k] = timestamp.timestamp()
+            
+            # Length, time and frequency metrics from one compiled pass
+            avg_message_length, time_variance, avg_frequency = activity_metrics(lengths, hours, epochs)
             
             # Recipient analysis
-            unique_recipients = len(set([msg.get('recipient_id') for msg in messages]))
-            
-            # Frequency analysis
-            if len(timestamps) > 1:
-                time_diffs = [(timestamps[i] - timestamps[i-1]).total_seconds() 
-                             for i in range(1, len(timestamps))]
-                avg_frequency = np.mean(time_diffs) if time_diffs else 0
-            else:
-                avg_frequency = 0
+            unique_recipients = len(recipients)
             
             # Create feature vector
             features = [
@@ -313,9 +648,9 @@ class ThreatDetector:
             ]
             
             if self.is_trained:
-                features_scaled = self.scaler.transform([features])
-                features_pca = self.pca.transform(features_scaled)
-                anomaly_score = self.model.decision_function(features_pca)[0]
+                serving = self._serving
+                features_pca = self._project([features], serving)
+                anomaly_score = self._decision_function(features_pca, serving)[0]
                 threat_score = max(0, min(100, (1 - anomaly_score) * 50))
             else:
                 threat_score = self._rule_based_threat_score(features)
@@ -326,136 +661,81 @@ class ThreatDetector:
             print(f"Error analyzing user activity: {e}")
             return 0.0
     
-    def _update_user_behavior(self, user_id: str, message_length: int, timestamp: datetime):
+    def _update_user_behavior(self, user_id: str, message_length: int, timestamp: datetime,
+                              now_epoch: Optional[float] = None):
         """Update user behavior tracking"""
-        try:
-            behavior = self.user_behavior[user_id]
-            
-            # Update message frequency (messages per hour)
-            current_hour = timestamp.hour
-            behavior['message_frequency'].append(current_hour)
-            
-            # Update message lengths
-            behavior['message_lengths'].append(message_length)
-            
-            # Update time patterns
-            behavior['time_patterns'].append(current_hour)
-            
-            # Update last activity
-            behavior['last_activity'] = timestamp
-            
-        except Exception as e:
-            print(f"Error updating user behavior: {e}")
+        # Update message count, length stats, hour and last activity
+        self.user_behavior.record(user_id, message_length, timestamp, now_epoch)
     
     def _extract_features(self, sender_id: str, recipient_id: str, 
-                         message_length: int, timestamp: datetime) -> List[float]:
+                         message_length: int, timestamp: datetime,
+                         now_epoch: Optional[float] = None) -> List[float]:
         """Extract features for threat detection"""
-        try:
-            behavior = self.user_behavior[sender_id]
-            
-            # Message frequency (messages per hour)
-            if len(behavior['message_frequency']) > 1:
-                msg_freq = len(behavior['message_frequency']) / max(1, 
-                    (timestamp - behavior['last_activity']).total_seconds() / 3600)
-            else:
-                msg_freq = 1.0
+        behavior = self.user_behavior
+        i = behavior.slot(sender_id)
+        
+        # Snapshot the user's row under its shard lock
+        with behavior.lock_for(sender_id):
+            message_count = int(behavior.message_count[i])
+            last_activity = float(behavior.last_activity[i])
             
             # Average message length
-            avg_length = np.mean(behavior['message_lengths']) if behavior['message_lengths'] else message_length
-            
-            # Time pattern (current hour)
-            time_pattern = timestamp.hour
+            avg_length = behavior.mean_length(i) if message_count else message_length
             
             # Message length variance
-            length_variance = np.var(behavior['message_lengths']) if len(behavior['message_lengths']) > 1 else 0
-            
-            # Response time (simulated)
-            response_time = 30.0  # Default response time
-            
-            # Session duration (simulated)
-            session_duration = 30.0  # Default session duration
-            
-            # Number of unique recipients (simulated)
-            unique_recipients = 3.0  # Default
-            
-            # Login frequency (simulated)
-            login_freq = 2.0  # Default
-            
-            # Geographic consistency (simulated)
-            geo_consistency = 0.8  # Default
-            
-            # Device consistency (simulated)
-            device_consistency = 0.9  # Default
-            
-            return [
-                msg_freq, avg_length, time_pattern, length_variance,
-                response_time, session_duration, unique_recipients,
-                login_freq, geo_consistency, device_consistency
-            ]
-            
-        except Exception as e:
-            print(f"Error extracting features: {e}")
-            return [0.0] * 10
+            length_variance = behavior.var_length(i) if message_count > 1 else 0
+        
+        # Message frequency (messages per hour)
+        if message_count > 1:
+            if now_epoch is None:
+                now_epoch = timestamp.timestamp()
+            msg_freq = message_count / max(1, (now_epoch - last_activity) / 3600)
+        else:
+            msg_freq = 1.0
+        
+        # Time pattern (current hour)
+        time_pattern = timestamp.hour
+        
+        # Response time (simulated)
+        response_time = 30.0  # Default response time
+        
+        # Session duration (simulated)
+        session_duration = 30.0  # Default session duration
+        
+        # Number of unique recipients (simulated)
+        unique_recipients = 3.0  # Default
+        
+        # Login frequency (simulated)
+        login_freq = 2.0  # Default
+        
+        # Geographic consistency (simulated)
+        geo_consistency = 0.8  # Default
+        
+        # Device consistency (simulated)
+        device_consistency = 0.9  # Default
+        
+        return [
+            msg_freq, avg_length, time_pattern, length_variance,
+            response_time, session_duration, unique_recipients,
+            login_freq, geo_consistency, device_consistency
+        ]
     
     def _rule_based_threat_score(self, features: List[float]) -> float:
         """Fallback rule-based threat scoring"""
-        try:
-            threat_score = 0.0
-            
-            msg_freq, avg_length, time_pattern, length_variance, response_time, \
-            session_duration, unique_recipients, login_freq, geo_consistency, device_consistency = features
-            
-            # High message frequency
-            if msg_freq > 20:
-                threat_score += 30
-            
-            # Unusual time patterns (late night/early morning)
-            if time_pattern < 5 or time_pattern > 22:
-                threat_score += 20
-            
-            # Very short or very long messages
-            if avg_length < 10 or avg_length > 500:
-                threat_score += 15
-            
-            # High variance in message lengths
-            if length_variance > 1000:
-                threat_score += 10
-            
-            # Very fast response times (bot-like)
-            if response_time < 1:
-                threat_score += 25
-            
-            # Many unique recipients
-            if unique_recipients > 10:
-                threat_score += 20
-            
-            # Low geographic consistency
-            if geo_consistency < 0.3:
-                threat_score += 15
-            
-            # Low device consistency
-            if device_consistency < 0.5:
-                threat_score += 10
-            
-            return min(100, threat_score)
-            
-        except Exception as e:
-            print(f"Error in rule-based threat scoring: {e}")
-            return 0.0
+        features = np.asarray(features, dtype=np.float64)
+        if features.shape != (10,):
+            raise ValueError(f"expected 10 features, got {features.shape}")
+        
+        return rule_based_score(features)
     
     def _update_global_threat_level(self, threat_score: float):
         """Update global threat level"""
-        try:
+        with self._threat_lock:
             self.threat_history.append(threat_score)
+            self.threat_window.append(threat_score)
             
-            # Calculate rolling average
-            if len(self.threat_history) > 10:
-                self.global_threat_level = np.mean(list(self.threat_history)[-10:])
-            else:
-                self.global_threat_level = np.mean(list(self.threat_history))
-                
-        except Exception as e:
-            print(f"Error updating global threat level: {e}")
+            # Calculate rolling average over the last 10 scores only
+            self.global_threat_level = float(sum(self.threat_window) / len(self.threat_window))
     
     def get_global_threat_level(self) -> float:
         """Get current global threat level"""
@@ -464,16 +744,33 @@ class ThreatDetector:
     def get_user_threat_summary(self, user_id: str) -> Dict[str, Any]:
         """Get threat summary for a specific user"""
         try:
-            behavior = self.user_behavior[user_id]
+            behavior = self.user_behavior
+            i = behavior.slot(user_id, create=False)
+            if i < 0:
+                return {
+                    'user_id': user_id,
+                    'message_count': 0,
+                    'avg_message_length': 0,
+                    'suspicious_count': 0,
+                    'last_activity': None,
+                    'unique_ips': 0,
+                    'threat_level': 'LOW'
+                }
+            
+            with behavior.lock_for(user_id):
+                message_count = int(behavior.message_count[i])
+                avg_message_length = behavior.mean_length(i)
+                suspicious_count = int(behavior.suspicious_count[i])
+                last_activity = behavior.last_activity[i]
             
             return {
                 'user_id': user_id,
-                'message_count': len(behavior['message_frequency']),
-                'avg_message_length': np.mean(behavior['message_lengths']) if behavior['message_lengths'] else 0,
-                'suspicious_count': behavior['suspicious_count'],
-                'last_activity': behavior['last_activity'].isoformat() if behavior['last_activity'] else None,
-                'unique_ips': len(behavior['ip_addresses']),
-                'threat_level': 'HIGH' if behavior['suspicious_count'] > 5 else 'MEDIUM' if behavior['suspicious_count'] > 2 else 'LOW'
+                'message_count': message_count,
+                'avg_message_length': avg_message_length,
+                'suspicious_count': suspicious_count,
+                'last_activity': datetime.fromtimestamp(last_activity).isoformat() if not np.isnan(last_activity) else None,
+                'unique_ips': len(behavior.ip_addresses[i]),
+                'threat_level': 'HIGH' if suspicious_count > 5 else 'MEDIUM' if suspicious_count > 2 else 'LOW'
             }
             
         except Exception as e:
@@ -507,21 +804,11 @@ class ThreatDetector:
             else:
                 X_combined = X_new
             
-            # Retrain model
-            X_scaled = self.scaler.fit_transform(X_combined)
-            X_pca = self.pca.fit_transform(X_scaled)
-            
-            self.model = IsolationForest(
-                contamination=0.1,
-                random_state=42,
-                n_estimators=100
-            )
-            self.model.fit(X_pca)
+            # Retrain model; scoring keeps using the current one until the swap
+            self._fit_and_publish(X_combined)
             
             # Save updated model
-            joblib.dump(self.model, self.model_path)
-            joblib.dump(self.scaler, self.scaler_path)
-            joblib.dump(self.pca, self.pca_path)
+            self._save_models()
             
             print("Model retrained successfully")
             return True
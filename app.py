@@ -3,42 +3,156 @@ TacticalLink Backend - AI-Powered Military-Grade Messaging System
 Main Flask application with all API endpoints
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
+import asyncio
+import hashlib
+import atexit
+import logging
+import logging.handlers
+import queue
 import threading
 import time
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Import our modules
-from database import Database
+from database import Database, AsyncDatabase, CHAT_USER_FIELDS
 from encryption import EncryptionManager
 from ai_threat import ThreatDetector
 from message_scheduler import MessageScheduler
+from realtime_state import RealtimeState
 from models import User, Message, ThreatLog, ChatRoom, GroupMessage
 
 # Load environment variables
 load_dotenv()
 
+# Handlers only enqueue records; a listener thread does the stderr writes off the request path
+log_queue = queue.Queue(-1)
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+logging.basicConfig(
+    level=os.getenv('LOG_LEVEL', 'INFO'),
+    handlers=[logging.handlers.QueueHandler(log_queue)]
+)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger = logging.getLogger(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider that parses request bodies and encodes responses with orjson"""
+    
+    option = orjson.OPT_NAIVE_UTC | orjson.OPT_SERIALIZE_NUMPY if orjson else 0
+    
+    def loads(self, s, **kwargs):
+        # Parses the raw request bytes directly; decode errors subclass ValueError as Flask expects
+        return orjson.loads(s)
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        # Hand orjson's UTF-8 bytes straight to the response, skipping the str round-trip
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'tactical-link-secret-key-2024')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(hours=24)
 
+class CachingJWTManager(JWTManager):
+    """JWTManager that reuses verified claims for tokens seen before"""
+    
+    def __init__(self, app=None, maxsize: int = 10000):
+        self._verified_tokens = OrderedDict()
+        self._verified_lock = threading.Lock()
+        self._verified_maxsize = maxsize
+        super().__init__(app)
+    
+    def _decode_jwt_from_config(self, encoded_token, csrf_value=None, allow_expired=False):
+        if csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        
+        key = hashlib.blake2b(encoded_token.encode(), digest_size=16).digest()
+        now = time.time()
+        with self._verified_lock:
+            entry = self._verified_tokens.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._verified_tokens.move_to_end(key)
+                    return dict(entry[0])
+                del self._verified_tokens[key]
+        
+        # Full signature and claim verification; invalid tokens raise and are never cached
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        exp = claims.get('exp')
+        if exp is not None:
+            with self._verified_lock:
+                self._verified_tokens[key] = (dict(claims), exp)
+                if len(self._verified_tokens) > self._verified_maxsize:
+                    self._verified_tokens.popitem(last=False)
+        return claims
+
 # Initialize extensions
-jwt = JWTManager(app)
+jwt = CachingJWTManager(app)
 CORS(app)
 
 # Initialize components
 db = Database()
+# Write out batched inserts on shutdown; registered after the log listener so it runs first
+atexit.register(db.close)
+async_db = AsyncDatabase(db)
 encryption_manager = EncryptionManager()
 threat_detector = ThreatDetector()
 message_scheduler = MessageScheduler()
 
-# Global variables for real-time threat monitoring
-threat_scores = {}
-active_users = set()
+# CPU-bound password hashing and key generation; bcrypt, argon2 and OpenSSL release the GIL
+crypto_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix='crypto')
+
+# Real-time threat monitoring state, shared across workers when Redis is configured
+realtime_state = RealtimeState()
+
+# Each active user's recent messages (newest first), kept by the threat monitor
+ACTIVITY_WINDOW = 10  # messages a user's activity score is computed from
+ACTIVITY_SWEEP_INTERVAL = 60  # seconds between dropping the windows of users no longer active
+recent_activity = {}
+
+def activity_window(user_id: str, before: datetime) -> deque:
+    """A user's message window, seeded on first sight with their stored messages sent before a time"""
+    window = recent_activity.get(user_id)
+    if window is None:
+        window = deque(db.get_user_recent_messages(user_id, ACTIVITY_WINDOW, before), maxlen=ACTIVITY_WINDOW)
+        recent_activity[user_id] = window
+    return window
+
+@app.before_request
+def set_request_time():
+    """Read the clock once per request; handlers share g.now"""
+    g.now = datetime.utcnow()
+
+MAX_PAGE_SIZE = 500
+
+def get_page_args(default_limit: int = 100):
+    """Read ?limit= and ?offset= from the query string, clamped to sane bounds"""
+    limit = request.args.get('limit', default_limit, type=int)
+    offset = request.args.get('offset', 0, type=int)
+    return max(1, min(limit, MAX_PAGE_SIZE)), max(0, offset)
 
 @app.route('/')
 def health_check():
@@ -46,12 +160,12 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'TacticalLink Backend',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': g.now
     })
 
 # Authentication endpoints
 @app.route('/auth/register', methods=['POST'])
-def register():
+async def register():
     """User registration endpoint"""
     try:
         data = request.get_json()
@@ -63,15 +177,16 @@ def register():
             return jsonify({'error': 'Missing required fields'}), 400
         
         # Check if user already exists
-        if db.get_user_by_username(username):
+        if db.username_exists(username):
             return jsonify({'error': 'Username already exists'}), 409
         
-        # Create new user
+        # Create new user, hashing the password and generating encryption keys concurrently
         user = User(username=username, email=email)
-        user.set_password(password)
-        
-        # Generate encryption keys
-        user.public_key, user.private_key = encryption_manager.generate_key_pair()
+        loop = asyncio.get_running_loop()
+        _, (user.public_key, user.private_key) = await asyncio.gather(
+            loop.run_in_executor(crypto_pool, user.set_password, password),
+            loop.run_in_executor(crypto_pool, encryption_manager.generate_key_pair)
+        )
         
         # Save to database
         user_id = db.create_user(user)
@@ -90,7 +205,7 @@ def register():
         return jsonify({'error': str(e)}), 500
 
 @app.route('/auth/login', methods=['POST'])
-def login():
+async def login():
     """User login endpoint"""
     try:
         data = request.get_json()
@@ -100,16 +215,15 @@ def login():
         if not username or not password:
             return jsonify({'error': 'Missing credentials'}), 400
         
-        # Authenticate user
-        user = db.authenticate_user(username, password)
+        # Authenticate user and update last login; the password check runs on the crypto pool
+        user = await asyncio.get_running_loop().run_in_executor(
+            crypto_pool, db.authenticate_user, username, password
+        )
         if not user:
             return jsonify({'error': 'Invalid credentials'}), 401
         
-        # Update last login
-        db.update_last_login(user['_id'])
-        
         # Add to active users
-        active_users.add(user['_id'])
+        realtime_state.add_active_user(user['_id'])
         
         # Create JWT token
         access_token = create_access_token(identity=str(user['_id']))
@@ -160,17 +274,31 @@ def send_message():
             session_key=session_key,
             self_destruct_time=self_destruct_time,
             read_once=read_once,
-            timestamp=datetime.utcnow(),
+            timestamp=g.now,
             original_content=message_content  # Store original content for sender
         )
         
         # Save message to database
         message_id = db.create_message(message)
+        realtime_state.push_threat_event({
+            'sender_id': current_user_id,
+            'recipient_id': recipient_id,
+            'content_length': len(encrypted_message),
+            'timestamp': message.timestamp
+        })
         
         # Schedule self-destruct if specified
         if self_destruct_time > 0:
             message_scheduler.schedule_destruction(
-                message_id, self_destruct_time, read_once
+                message_id, self_destruct_time, read_once,
+                message={
+                    'session_key': session_key,
+                    'sender_id': current_user_id,
+                    'recipient_id': recipient_id,
+                    'self_destruct_time': self_destruct_time,
+                    'read_once': read_once,
+                    'content_length': len(encrypted_message)
+                }
             )
         
         # AI Threat Detection
@@ -178,16 +306,19 @@ def send_message():
             sender_id=current_user_id,
             recipient_id=recipient_id,
             message_length=len(message_content),
-            timestamp=datetime.utcnow()
+            timestamp=g.now
         )
         
+        # Rotate keys if the global threat level has spiked; a single comparison otherwise
+        encryption_manager.adaptive_key_rotation(threat_detector.get_global_threat_level())
+        
         # Log threat if score is high
         if threat_score > 70:
             threat_log = ThreatLog(
                 user_id=current_user_id,
                 threat_score=threat_score,
                 reason="High message frequency or suspicious pattern",
-                timestamp=datetime.utcnow()
+                timestamp=g.now
             )
             db.create_threat_log(threat_log)
         
@@ -213,9 +344,12 @@ def receive_messages():
             return jsonify({'error': 'User not found'}), 404
         
         # Get pending messages
-        messages = db.get_pending_messages(current_user_id)
+        messages = db.iter_pending_messages(current_user_id)
         
         decrypted_messages = []
+        read_ids = []
+        read_once_ids = []
+        read_once_keys = []
         for msg in messages:
             try:
                 # Decrypt message
@@ -228,22 +362,25 @@ def receive_messages():
                     'sender_id': msg['sender_id'],
                     'recipient_id': msg['recipient_id'],
                     'content': decrypted_content,
-                    'timestamp': msg['timestamp'].isoformat(),
+                    'timestamp': msg['timestamp'],
                     'read_once': msg['read_once']
                 })
                 
-                # Mark as read
-                db.mark_message_as_read(msg['_id'])
+                read_ids.append(msg['_id'])
                 
                 # Delete immediately if read_once is True
                 if msg['read_once']:
-                    db.delete_message(msg['_id'])
-                    encryption_manager.destroy_key(msg['session_key'])
+                    read_once_ids.append(msg['_id'])
+                    read_once_keys.append(msg['session_key'])
                 
-            except Exception as e:
-                print(f"Error decrypting message {msg['_id']}: {e}")
+            except Exception:
+                logger.exception("Error decrypting message %s", msg['_id'])
                 continue
         
+        # Mark as read and delete read-once messages in one bulk write
+        db.mark_messages_read_and_delete(read_ids, read_once_ids)
+        encryption_manager.destroy_keys(read_once_keys)
+        
         return jsonify({
             'messages': decrypted_messages,
             'count': len(decrypted_messages)
@@ -295,12 +432,12 @@ def analyze_threat():
         )
         
         # Update global threat scores
-        threat_scores[current_user_id] = threat_score
+        realtime_state.set_threat_score(current_user_id, threat_score)
         
         return jsonify({
             'threat_score': threat_score,
             'risk_level': 'HIGH' if threat_score > 70 else 'MEDIUM' if threat_score > 40 else 'LOW',
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now
         }), 200
         
     except Exception as e:
@@ -309,7 +446,7 @@ def analyze_threat():
 # Admin endpoints
 @app.route('/admin/dashboard', methods=['GET'])
 @jwt_required()
-def admin_dashboard():
+async def admin_dashboard():
     """Get admin dashboard data"""
     try:
         current_user_id = get_jwt_identity()
@@ -319,19 +456,21 @@ def admin_dashboard():
         if not user or not user.get('is_admin', False):
             return jsonify({'error': 'Admin access required'}), 403
         
-        # Get dashboard data
-        total_users = db.get_total_users()
-        active_user_count = len(active_users)
-        recent_threats = db.get_recent_threat_logs(limit=20)
-        message_stats = db.get_message_statistics()
+        # Get dashboard data, overlapping the independent queries
+        total_users, recent_threats, message_stats = await asyncio.gather(
+            async_db.get_total_users(),
+            async_db.get_recent_threat_logs(limit=20),
+            async_db.get_message_statistics()
+        )
+        active_user_count = realtime_state.get_active_user_count()
         
         return jsonify({
             'total_users': total_users,
             'active_users': active_user_count,
-            'threat_scores': threat_scores,
+            'threat_scores': realtime_state.get_threat_scores(),
             'recent_threats': recent_threats,
             'message_stats': message_stats,
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now
         }), 200
         
     except Exception as e:
@@ -350,7 +489,7 @@ def get_conversation(recipient_id):
             return jsonify({'error': 'User not found'}), 404
         
         # Get conversation messages (both sent and received)
-        messages = db.get_conversation_messages(current_user_id, recipient_id)
+        messages = db.iter_conversation_messages(current_user_id, recipient_id)
         
         decrypted_messages = []
         for msg in messages:
@@ -369,13 +508,13 @@ def get_conversation(recipient_id):
                     'sender_id': msg['sender_id'],
                     'recipient_id': msg['recipient_id'],
                     'content': decrypted_content,
-                    'timestamp': msg['timestamp'].isoformat(),
+                    'timestamp': msg['timestamp'],
                     'read_once': msg['read_once'],
                     'is_read': msg['is_read']
                 })
                 
-            except Exception as e:
-                print(f"Error processing message {msg['_id']}: {e}")
+            except Exception:
+                logger.exception("Error processing message %s", msg['_id'])
                 continue
         
         return jsonify({
@@ -392,19 +531,30 @@ def get_chat_users():
     """Get users for chat (all authenticated users)"""
     try:
         current_user_id = get_jwt_identity()
-        print(f"Getting chat users for user: {current_user_id}")
+        logger.debug("Getting chat users for user: %s", current_user_id)
         
-        # Get all active users except current user
-        users = db.get_all_users()
-        print(f"Total users in database: {len(users)}")
+        limit, offset = get_page_args()
         
-        chat_users = [user for user in users if user['_id'] != current_user_id]
-        print(f"Chat users (excluding current): {len(chat_users)}")
+        # ?fields=username,is_admin trims the payload for clients that don't need public keys
+        fields = [f for f in request.args.get('fields', '').split(',') if f in CHAT_USER_FIELDS]
         
-        return jsonify({'users': chat_users}), 200
+        # Get one page of active users except current user
+        chat_users = db.get_chat_users(current_user_id, limit=limit, offset=offset,
+                                       fields=fields or CHAT_USER_FIELDS)
+        logger.debug("Chat users (excluding current): %d", len(chat_users))
+        
+        response = jsonify({
+            'users': chat_users,
+            'limit': limit,
+            'offset': offset
+        })
+        # The chat UI polls this list; an ETag lets an unchanged page come back as an empty 304
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.add_etag()
+        return response.make_conditional(request)
         
     except Exception as e:
-        print(f"Error getting chat users: {e}")
+        logger.error("Error getting chat users: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/admin/users', methods=['GET'])
@@ -419,8 +569,13 @@ def get_all_users():
         if not user or not user.get('is_admin', False):
             return jsonify({'error': 'Admin access required'}), 403
         
-        users = db.get_all_users()
-        return jsonify({'users': users}), 200
+        limit, offset = get_page_args()
+        users = db.get_all_users(limit=limit, offset=offset)
+        return jsonify({
+            'users': users,
+            'limit': limit,
+            'offset': offset
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -442,7 +597,7 @@ def verify_auth():
             'user_id': current_user_id,
             'username': user['username'],
             'is_admin': user.get('is_admin', False),
-            'timestamp': datetime.utcnow().isoformat()
+            'timestamp': g.now
         }), 200
         
     except Exception as e:
@@ -479,18 +634,8 @@ def get_chat_rooms():
     try:
         current_user_id = get_jwt_identity()
         
-        # Get public rooms and user's rooms
-        public_rooms = db.get_public_chat_rooms()
-        user_rooms = db.get_user_chat_rooms(current_user_id)
-        
-        # Combine and deduplicate
-        all_rooms = {}
-        for room in public_rooms + user_rooms:
-            room_id = room['_id']
-            if room_id not in all_rooms:
-                all_rooms[room_id] = room
-        
-        rooms_list = list(all_rooms.values())
+        # Get public rooms and user's rooms in one deduplicated query
+        rooms_list = db.get_visible_chat_rooms(current_user_id)
         
         return jsonify({
             'rooms': rooms_list,
@@ -556,7 +701,7 @@ def join_chat_room(room_id):
         current_user_id = get_jwt_identity()
         
         # Check if room exists
-        room = db.get_chat_room_by_id(room_id)
+        room = db.get_chat_room_membership(current_user_id, room_id=room_id)
         if not room:
             return jsonify({'error': 'Chat room not found'}), 404
         
@@ -565,11 +710,11 @@ def join_chat_room(room_id):
             return jsonify({'error': 'Chat room is not active'}), 400
         
         # Check if user is already a member
-        if current_user_id in room.get('members', []):
+        if room['is_member']:
             return jsonify({'message': 'Already a member of this room'}), 200
         
         # Check if room has space
-        if len(room.get('members', [])) >= room.get('max_members', 50):
+        if room['member_count'] >= room.get('max_members', 50):
             return jsonify({'error': 'Room is full'}), 400
         
         # Add user to room
@@ -598,8 +743,12 @@ def join_chat_room_by_key():
         if not join_key:
             return jsonify({'error': 'Join key is required'}), 400
         
+        # A malformed key can't match any room; skip the lookup
+        if not isinstance(join_key, str) or not ChatRoom.is_valid_join_key(join_key):
+            return jsonify({'error': 'Invalid join key'}), 404
+        
         # Find room by join key
-        room = db.get_chat_room_by_join_key(join_key)
+        room = db.get_chat_room_membership(current_user_id, join_key=join_key)
         if not room:
             return jsonify({'error': 'Invalid join key'}), 404
         
@@ -608,11 +757,11 @@ def join_chat_room_by_key():
             return jsonify({'error': 'Chat room is not active'}), 400
         
         # Check if user is already a member
-        if current_user_id in room.get('members', []):
+        if room['is_member']:
             return jsonify({'message': 'Already a member of this room'}), 200
         
         # Check if room has space
-        if len(room.get('members', [])) >= room.get('max_members', 50):
+        if room['member_count'] >= room.get('max_members', 50):
             return jsonify({'error': 'Room is full'}), 400
         
         # Add user to room
@@ -653,20 +802,21 @@ def get_room_messages(room_id):
         current_user_id = get_jwt_identity()
         
         # Check if user is member of the room
-        room = db.get_chat_room_by_id(room_id)
+        room = db.get_chat_room_membership(current_user_id, room_id=room_id)
         if not room:
             return jsonify({'error': 'Chat room not found'}), 404
         
-        if current_user_id not in room['members']:
+        if not room['is_member']:
             return jsonify({'error': 'You are not a member of this room'}), 403
         
         # Get messages
         messages = db.get_room_messages(room_id)
         
-        # Get sender usernames
+        # Get sender usernames with a single lookup
+        sender_ids = {message['sender_id'] for message in messages}
+        name_by_id = {u['_id']: u['username'] for u in db.get_users_by_ids(sender_ids)}
         for message in messages:
-            sender = db.get_user_by_id(message['sender_id'])
-            message['sender_username'] = sender['username'] if sender else 'Unknown'
+            message['sender_username'] = name_by_id.get(message['sender_id'], 'Unknown')
         
         return jsonify({
             'messages': messages,
@@ -692,11 +842,11 @@ def send_group_message(room_id):
             return jsonify({'error': 'Message content is required'}), 400
         
         # Check if user is member of the room
-        room = db.get_chat_room_by_id(room_id)
+        room = db.get_chat_room_membership(current_user_id, room_id=room_id)
         if not room:
             return jsonify({'error': 'Chat room not found'}), 404
         
-        if current_user_id not in room['members']:
+        if not room['is_member']:
             return jsonify({'error': 'You are not a member of this room'}), 403
         
         # Create group message
@@ -714,9 +864,12 @@ def send_group_message(room_id):
             sender_id=current_user_id,
             recipient_id=room_id,  # Using room_id as recipient for group messages
             message_length=len(content),
-            timestamp=datetime.utcnow()
+            timestamp=g.now
         )
         
+        # Rotate keys if the global threat level has spiked; a single comparison otherwise
+        encryption_manager.adaptive_key_rotation(threat_detector.get_global_threat_level())
+        
         return jsonify({
             'message': 'Message sent successfully',
             'message_id': message_id,
@@ -734,10 +887,9 @@ def delete_group_message(room_id, message_id):
         current_user_id = get_jwt_identity()
         
         # Get the message to check ownership
-        messages = db.get_room_messages(room_id)
-        message = next((m for m in messages if m['_id'] == message_id), None)
+        message = db.get_group_message_by_id(message_id)
         
-        if not message:
+        if not message or message['room_id'] != room_id or message.get('is_deleted', False):
             return jsonify({'error': 'Message not found'}), 404
         
         # Only sender can delete their message
@@ -763,26 +915,39 @@ def websocket_status():
         
         return jsonify({
             'user_id': current_user_id,
-            'threat_score': threat_scores.get(current_user_id, 0),
-            'active_users': list(active_users),
-            'timestamp': datetime.utcnow().isoformat()
+            'threat_score': realtime_state.get_threat_score(current_user_id, 0),
+            'active_users': realtime_state.get_active_users(),
+            'timestamp': g.now
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 # Background task for threat monitoring
-def threat_monitoring_task():
-    """Background task for continuous threat monitoring"""
+def threat_monitoring_task(max_batch: int = 50):
+    """Background task that rescores users as their messages are sent"""
+    next_sweep = time.monotonic() + ACTIVITY_SWEEP_INTERVAL
     while True:
         try:
-            # Analyze all active users
-            for user_id in active_users.copy():
-                recent_messages = db.get_user_recent_messages(user_id, limit=10)
-                threat_score = threat_detector.analyze_user_activity(
-                    user_id, recent_messages
-                )
-                threat_scores[user_id] = threat_score
+            # Block for the next message, then drain whatever else is queued
+            events = realtime_state.pop_threat_events(max_batch)
+            
+            # Each user's events in this batch, oldest first
+            user_events = defaultdict(list)
+            for event in events:
+                for user_id in (event['sender_id'], event['recipient_id']):
+                    user_events[user_id].append(event)
+            
+            # Rescore only active users whose message window changed
+            for user_id, new_events in user_events.items():
+                if not realtime_state.is_active(user_id):
+                    recent_activity.pop(user_id, None)
+                    continue
+                # Seed from the messages sent before this batch, so a restart keeps a full window
+                window = activity_window(user_id, new_events[0]['timestamp'])
+                window.extendleft(new_events)
+                threat_score = threat_detector.analyze_user_activity(user_id, list(window))
+                realtime_state.set_threat_score(user_id, threat_score)
                 
                 # Log high threat scores
                 if threat_score > 80:
@@ -794,17 +959,28 @@ def threat_monitoring_task():
                     )
                     db.create_threat_log(threat_log)
             
-            time.sleep(30)  # Check every 30 seconds
+            # pop_threat_events times out when idle, so this also runs with no traffic
+            if time.monotonic() >= next_sweep:
+                for user_id in recent_activity.keys() - set(realtime_state.get_active_users()):
+                    del recent_activity[user_id]
+                next_sweep = time.monotonic() + ACTIVITY_SWEEP_INTERVAL
             
-        except Exception as e:
-            print(f"Error in threat monitoring: {e}")
-            time.sleep(60)
+        except Exception:
+            logger.exception("Error in threat monitoring")
+            time.sleep(1)
+
+# Without Redis, threat events only reach this process's own queue, so each web process
+# monitors them itself; with Redis, worker.py runs the one shared monitor
+if realtime_state.redis is None:
+    threading.Thread(target=threat_monitoring_task, daemon=True).start()
 
 # Start background tasks
 if __name__ == '__main__':
-    # Start threat monitoring in background thread
-    threat_thread = threading.Thread(target=threat_monitoring_task, daemon=True)
-    threat_thread.start()
+    # Single-process development server; production runs these in worker.py
+    # Start threat monitoring in background thread, unless it is already running above
+    if realtime_state.redis is not None:
+        threat_thread = threading.Thread(target=threat_monitoring_task, daemon=True)
+        threat_thread.start()
     
     # Start message scheduler
     message_scheduler.start()
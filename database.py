@@ -3,81 +3,298 @@ TacticalLink Database Manager
 MongoDB operations for users, messages, and threat logs
 """
 
-from pymongo import MongoClient
-from pymongo.errors import DuplicateKeyError, ConnectionFailure
+from pymongo import IndexModel, MongoClient, ReturnDocument, UpdateMany
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ConnectionFailure
 from bson import ObjectId
+from bson.codec_options import CodecOptions, TypeDecoder, TypeRegistry
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
+import asyncio
+import logging
 import os
+from concurrent.futures import Future, ThreadPoolExecutor
+import threading
+import time
 from dotenv import load_dotenv
-from models import User, Message, ThreatLog, SessionKey, ChatRoom, GroupMessage
+from functools import lru_cache
+from models import User, Message, ThreatLog, SessionKey, ChatRoom, GroupMessage, verify_password
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import snappy
+except ImportError:
+    snappy = None
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+@lru_cache(maxsize=4096)
+def _oid(id_str: str) -> ObjectId:
+    """Parse a user or room ID once; these strings recur on every request"""
+    return ObjectId(id_str)
+
+class ObjectIdStrDecoder(TypeDecoder):
+    """Decode ObjectIds straight to hex strings, the form the app passes around"""
+    bson_type = ObjectId
+    
+    def transform_bson(self, value):
+        return str(value)
+
+# Codec for the read handle: string IDs come out of BSON decoding, with no per-document pass
+READ_CODEC_OPTIONS = CodecOptions(
+    document_class=dict,
+    tz_aware=False,
+    unicode_decode_error_handler='strict',
+    type_registry=TypeRegistry([ObjectIdStrDecoder()])
+)
+
+# Wire compressors in preference order; zlib ships with Python, the others are optional
+WIRE_COMPRESSORS = ','.join(
+    name for name, available in (('zstd', zstandard), ('snappy', snappy), ('zlib', True)) if available
+)
+
+# Fields /chat/users may return; callers can ask for a subset to trim the payload
+CHAT_USER_FIELDS = ('username', 'public_key', 'is_admin')
+
+# One client, and so one connection pool, per process; MongoClient is thread-safe
+_client = None
+_client_lock = threading.Lock()
+_indexes_created = False
+
+def get_client() -> MongoClient:
+    """Return the process-wide MongoClient, connecting on first use"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            # Use Railway MongoDB URL or local fallback
+            mongodb_url = os.getenv('MONGODB_URL', 'mongodb://localhost:27017/tactical_link')
+            client = MongoClient(
+                mongodb_url,
+                serverSelectionTimeoutMS=5000,
+                minPoolSize=10,
+                maxPoolSize=50,
+                maxIdleTimeMS=300000,
+                compressors=WIRE_COMPRESSORS,
+                zlibCompressionLevel=3,
+                # Decode BSON dates as naive UTC datetimes into plain dicts: no per-field
+                # timezone conversion, and they compare directly with datetime.utcnow()
+                tz_aware=False,
+                document_class=dict,
+                unicode_decode_error_handler='strict'
+            )
+            
+            # Test connection
+            client.admin.command('ping')
+            logger.info("Connected to MongoDB successfully")
+            _client = client
+        return _client
+
+class InsertBatcher:
+    """Buffers inserts into one collection and writes them with insert_many"""
+    
+    def __init__(self, collection, max_batch: int = 50, interval: float = 0.005):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.interval = interval  # seconds a lone insert waits for company
+        self._pending = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._full = threading.Event()
+        self._thread = None
+    
+    def insert(self, document: Dict) -> Future:
+        """Queue a document; the returned future resolves to its _id once its batch is written"""
+        document.setdefault('_id', ObjectId())
+        future = Future()
+        with self._lock:
+            self._pending.append((document, future))
+            if len(self._pending) >= self.max_batch:
+                self._full.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return future
+    
+    def flush(self):
+        """Write every queued document now"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+            self._wakeup.clear()
+            self._full.clear()
+        
+        if not batch:
+            return
+        errors = {}
+        try:
+            self.collection.insert_many([document for document, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            # Unordered, so only the documents named in writeErrors were not written
+            logger.exception("Error flushing %d inserts into %s", len(batch), self.collection.name)
+            errors = {error['index']: e for error in e.details.get('writeErrors', [])}
+        except Exception as e:
+            logger.exception("Error flushing %d inserts into %s", len(batch), self.collection.name)
+            errors = dict.fromkeys(range(len(batch)), e)
+        
+        for index, (document, future) in enumerate(batch):
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(document['_id'])
+    
+    def _run(self):
+        """Flush every interval, or sooner once a full batch is waiting"""
+        while True:
+            self._wakeup.wait()
+            self._full.wait(self.interval)
+            self.flush()
+
 class Database:
     """MongoDB database manager for TacticalLink"""
     
+    USER_CACHE_TTL = 60  # seconds a cached user document stays fresh
+    USER_CACHE_MAXSIZE = 10000
+    DESTRUCTED_MESSAGE_GRACE = 3600  # seconds a destroyed message lingers, once logged, before the TTL monitor deletes it
+    # destruct_at for messages that never self-destruct; always setting the field keeps
+    # the pending-messages filter a single range instead of an $or with a null match
+    NEVER_DESTRUCT = datetime(9999, 12, 31)
+    # Message fields threat analysis reads; the ciphertext is reduced to its length server-side
+    ACTIVITY_FIELDS = {
+        "sender_id": 1,
+        "recipient_id": 1,
+        "timestamp": 1,
+        "content_length": {"$strLenCP": {"$ifNull": ["$content", ""]}}
+    }
+    JOIN_KEY_ATTEMPTS = 5  # fresh join keys tried when a new room's key is already taken
+    INSERT_TIMEOUT = 10  # seconds a send waits for its batched insert to be written
+    
     def __init__(self):
         self.client = None
         self.db = None
+        self.docs = None
+        self._user_cache = {}
+        self._user_cache_lock = threading.Lock()
         self.connect()
         self.create_indexes()
+        self.message_inserts = InsertBatcher(self.db.messages)
+        self.group_message_inserts = InsertBatcher(self.db.group_messages)
+        self.threat_log_inserts = InsertBatcher(self.db.threat_logs)
     
     def connect(self):
-        """Connect to MongoDB"""
+        """Connect to MongoDB through the shared client"""
         try:
-            # Use Railway MongoDB URL or local fallback
-            mongodb_url = os.getenv('MONGODB_URL', 'mongodb://localhost:27017/tactical_link')
-            self.client = MongoClient(mongodb_url, serverSelectionTimeoutMS=5000)
+            self.client = get_client()
             self.db = self.client.tactical_link
+            # Same database, but documents read through it carry string IDs
+            self.docs = self.client.get_database('tactical_link', codec_options=READ_CODEC_OPTIONS)
             
-            # Test connection
-            self.client.admin.command('ping')
-            print("Connected to MongoDB successfully")
-            
-        except ConnectionFailure as e:
-            print(f"Failed to connect to MongoDB: {e}")
+        except ConnectionFailure:
+            logger.exception("Failed to connect to MongoDB")
             raise
     
     def create_indexes(self):
-        """Create database indexes for performance"""
+        """Create database indexes for performance, once per process"""
+        global _indexes_created
+        if _indexes_created:
+            return
         try:
             # Users collection indexes
-            self.db.users.create_index("username", unique=True)
-            self.db.users.create_index("email", unique=True)
-            self.db.users.create_index("created_at")
-            
-            # Messages collection indexes
-            self.db.messages.create_index("sender_id")
-            self.db.messages.create_index("recipient_id")
-            self.db.messages.create_index("timestamp")
-            self.db.messages.create_index("destruct_at")
-            self.db.messages.create_index([("sender_id", 1), ("recipient_id", 1)])
-            
-            # Threat logs collection indexes
-            self.db.threat_logs.create_index("user_id")
-            self.db.threat_logs.create_index("timestamp")
-            self.db.threat_logs.create_index("threat_score")
+            self._sync_indexes(self.db.users, [
+                IndexModel("username", unique=True),
+                IndexModel("email", unique=True),
+                IndexModel("created_at")
+            ])
+            
+            # Messages collection indexes, ordered equality-sort-range to match the queries;
+            # their sender_id / recipient_id prefixes also serve single-field lookups.
+            # Expired self-destruct messages are soft-deleted and logged by the scheduler, which
+            # then stamps destroyed_at; the TTL on that field removes only rows already logged,
+            # so a stopped scheduler leaves expired messages in place rather than losing their log
+            self._sync_indexes(self.db.messages, [
+                IndexModel([("recipient_id", 1), ("is_read", 1), ("is_deleted", 1), ("timestamp", 1)]),
+                IndexModel([("sender_id", 1), ("recipient_id", 1), ("timestamp", 1)]),
+                IndexModel("timestamp"),
+                IndexModel("destruct_at"),
+                IndexModel(
+                    "destroyed_at",
+                    expireAfterSeconds=self.DESTRUCTED_MESSAGE_GRACE,
+                    partialFilterExpression={"is_deleted": True}
+                )
+            ], superseded=("sender_id_1", "recipient_id_1", "sender_id_1_recipient_id_1"))
+            # Messages stored before destruct_at was always set have it null or missing
+            self.db.messages.update_many({"destruct_at": None}, {"$set": {"destruct_at": self.NEVER_DESTRUCT}})
+            
+            # Threat logs collection indexes; (is_resolved, timestamp) serves the scheduler's
+            # resolved-log retention delete
+            self._sync_indexes(self.db.threat_logs, [
+                IndexModel("user_id"),
+                IndexModel("timestamp"),
+                IndexModel("threat_score"),
+                IndexModel([("is_resolved", 1), ("timestamp", 1)])
+            ])
+            
+            # System logs collection indexes, for the scheduler's retention delete
+            self._sync_indexes(self.db.system_logs, [
+                IndexModel("timestamp")
+            ])
             
             # Session keys collection indexes
-            self.db.session_keys.create_index("key_id", unique=True)
-            self.db.session_keys.create_index("expires_at")
+            self._sync_indexes(self.db.session_keys, [
+                IndexModel("key_id", unique=True),
+                IndexModel("expires_at", expireAfterSeconds=0)
+            ])
             
             # Chat rooms collection indexes
-            self.db.chat_rooms.create_index("name", unique=True)
-            self.db.chat_rooms.create_index("join_key", unique=True)
-            self.db.chat_rooms.create_index("created_by")
-            self.db.chat_rooms.create_index("is_active")
+            self._sync_indexes(self.db.chat_rooms, [
+                IndexModel("name", unique=True),
+                IndexModel("join_key", unique=True),
+                IndexModel("created_by"),
+                IndexModel("is_active"),
+                IndexModel([("is_public", 1), ("is_active", 1)]),
+                IndexModel("members")
+            ])
             
             # Group messages collection indexes
-            self.db.group_messages.create_index("room_id")
-            self.db.group_messages.create_index("sender_id")
-            self.db.group_messages.create_index("timestamp")
-            
-            print("Database indexes created successfully")
-            
-        except Exception as e:
-            print(f"Error creating indexes: {e}")
+            self._sync_indexes(self.db.group_messages, [
+                IndexModel([("room_id", 1), ("is_deleted", 1), ("timestamp", -1)]),
+                IndexModel("sender_id"),
+                IndexModel("timestamp")
+            ], superseded=("room_id_1",))
+            
+            _indexes_created = True
+            logger.info("Database indexes created successfully")
+            
+        except Exception:
+            logger.exception("Error creating indexes")
+    
+    def _iter_documents(self, cursor, batch_size: int = 500) -> Iterator[Dict]:
+        """Stream cursor documents, fetching batch_size documents per getMore"""
+        return cursor.batch_size(batch_size)
+    
+    def _sync_indexes(self, collection, indexes: List[IndexModel], superseded=()):
+        """Drop superseded indexes and create only the missing ones in a single command"""
+        existing = collection.index_information()
+        for name in superseded:
+            if name in existing:
+                collection.drop_index(name)
+        
+        missing = []
+        for index in indexes:
+            spec = index.document
+            info = existing.get(spec['name'])
+            if info is not None:
+                if info.get('expireAfterSeconds') == spec.get('expireAfterSeconds'):
+                    continue
+                # Same key with a different TTL, or a TTL being added or removed
+                collection.drop_index(spec['name'])
+            missing.append(index)
+        if missing:
+            collection.create_indexes(missing)
     
     # User operations
     def create_user(self, user: User) -> str:
@@ -92,139 +309,186 @@ class Database:
             raise Exception(f"Error creating user: {e}")
     
     def get_user_by_id(self, user_id: str) -> Optional[Dict]:
-        """Get user by ID"""
-        try:
-            user = self.db.users.find_one({"_id": ObjectId(user_id)})
+        """Get user by ID, served from a short-lived in-process cache"""
+        now = time.monotonic()
+        entry = self._user_cache.get(user_id)
+        if entry is not None and entry[0] > now:
+            return dict(entry[1])
+        
+        try:
+            user = self.docs.users.find_one({"_id": _oid(user_id)}, {"password_hash": 0})
             if user:
-                user['_id'] = str(user['_id'])
+                with self._user_cache_lock:
+                    if len(self._user_cache) >= self.USER_CACHE_MAXSIZE:
+                        self._user_cache.clear()
+                    self._user_cache[user_id] = (now + self.USER_CACHE_TTL, dict(user))
             return user
-        except Exception as e:
-            print(f"Error getting user by ID: {e}")
+        except Exception:
+            logger.exception("Error getting user by ID")
             return None
     
+    def get_users_by_ids(self, user_ids) -> List[Dict]:
+        """Get the usernames of several users in one query"""
+        try:
+            object_ids = [_oid(uid) for uid in user_ids if ObjectId.is_valid(uid)]
+            users = list(self.docs.users.find(
+                {"_id": {"$in": object_ids}},
+                {"username": 1}
+            ))
+            return users
+        except Exception:
+            logger.exception("Error getting users by IDs")
+            return []
+    
     def get_user_by_username(self, username: str) -> Optional[Dict]:
         """Get user by username"""
         try:
-            user = self.db.users.find_one({"username": username})
-            if user:
-                user['_id'] = str(user['_id'])
-            return user
-        except Exception as e:
-            print(f"Error getting user by username: {e}")
+            return self.docs.users.find_one({"username": username})
+        except Exception:
+            logger.exception("Error getting user by username")
             return None
     
+    def username_exists(self, username: str) -> bool:
+        """Check whether a username is taken without fetching the user"""
+        try:
+            return self.db.users.find_one({"username": username}, {"_id": 1}) is not None
+        except Exception:
+            logger.exception("Error checking username")
+            return False
+    
     def authenticate_user(self, username: str, password: str) -> Optional[Dict]:
-        """Authenticate user with username and password"""
+        """Authenticate user and stamp last_login, returning the fields a login answers with"""
         try:
-            user = self.get_user_by_username(username)
-            if not user:
+            user = self.db.users.find_one({"username": username}, {"password_hash": 1})
+            if not user or not user.get('password_hash'):
+                return None
+            if not verify_password(password, user['password_hash']):
                 return None
             
-            # Create User object to check password
-            user_obj = User.from_dict(user)
-            if user_obj.check_password(password):
-                return user
-            return None
+            # Record the login and read back the response fields in the same round trip
+            self.invalidate_user(str(user['_id']))
+            return self.docs.users.find_one_and_update(
+                {"_id": user['_id']},
+                {"$set": {"last_login": datetime.utcnow()}},
+                projection={"username": 1, "email": 1, "public_key": 1},
+                return_document=ReturnDocument.AFTER
+            )
             
-        except Exception as e:
-            print(f"Error authenticating user: {e}")
+        except Exception:
+            logger.exception("Error authenticating user")
             return None
     
+    def invalidate_user(self, user_id: str):
+        """Drop a user from the in-process cache"""
+        with self._user_cache_lock:
+            self._user_cache.pop(str(user_id), None)
+    
     def update_last_login(self, user_id: str):
         """Update user's last login timestamp"""
+        self.invalidate_user(user_id)
         try:
             self.db.users.update_one(
-                {"_id": ObjectId(user_id)},
+                {"_id": _oid(user_id)},
                 {"$set": {"last_login": datetime.utcnow()}}
             )
-        except Exception as e:
-            print(f"Error updating last login: {e}")
+        except Exception:
+            logger.exception("Error updating last login")
     
-    def get_all_users(self) -> List[Dict]:
-        """Get all users (admin function)"""
+    def get_all_users(self, limit: int = 0, offset: int = 0) -> List[Dict]:
+        """Get active users without sensitive fields (admin function)"""
         try:
-            users = list(self.db.users.find({"is_active": True}))
-            for user in users:
-                user['_id'] = str(user['_id'])
-                # Remove sensitive data
-                user.pop('password_hash', None)
-                user.pop('private_key', None)
+            users = list(self.docs.users.find(
+                {"is_active": True},
+                {"password_hash": 0, "private_key": 0}
+            ).sort("_id", 1).skip(offset).limit(limit))
             return users
-        except Exception as e:
-            print(f"Error getting all users: {e}")
+        except Exception:
+            logger.exception("Error getting all users")
+            return []
+    
+    def get_chat_users(self, exclude_id: str, limit: int = 100, offset: int = 0,
+                       fields=CHAT_USER_FIELDS) -> List[Dict]:
+        """Get one page of active users other than exclude_id, with only the given chat fields"""
+        try:
+            query = {"is_active": True}
+            if ObjectId.is_valid(exclude_id):
+                query["_id"] = {"$ne": _oid(exclude_id)}
+            users = list(self.docs.users.find(
+                query,
+                dict.fromkeys(fields, 1)
+            ).sort("_id", 1).skip(offset).limit(limit))
+            return users
+        except Exception:
+            logger.exception("Error getting chat users")
             return []
     
     def get_total_users(self) -> int:
         """Get total number of active users"""
         try:
-            return self.db.users.count_documents({"is_active": True})
-        except Exception as e:
-            print(f"Error getting total users: {e}")
+            # Nothing deactivates users, so the collection-metadata count equals the
+            # active count without scanning the users collection on every dashboard load
+            return self.db.users.estimated_document_count()
+        except Exception:
+            logger.exception("Error getting total users")
             return 0
     
     def delete_user(self, user_id: str) -> bool:
         """Delete a user and all their data"""
-        try:
-            # Delete user
-            result = self.db.users.delete_one({"_id": ObjectId(user_id)})
-            
-            # Delete user's messages
-            self.db.messages.delete_many({
-                "$or": [
-                    {"sender_id": user_id},
-                    {"recipient_id": user_id}
+        self.invalidate_user(user_id)
+        try:
+            # Delete the user, their messages on each side, and their threat logs concurrently;
+            # one single-field delete per index instead of an $or merging two index scans
+            with ThreadPoolExecutor(max_workers=4) as executor:
+                user_delete = executor.submit(self.db.users.delete_one, {"_id": _oid(user_id)})
+                cascade = [
+                    executor.submit(self.db.messages.delete_many, {"sender_id": user_id}),
+                    executor.submit(self.db.messages.delete_many, {"recipient_id": user_id}),
+                    executor.submit(self.db.threat_logs.delete_many, {"user_id": user_id})
                 ]
-            })
-            
-            # Delete user's threat logs
-            self.db.threat_logs.delete_many({"user_id": user_id})
+                result = user_delete.result()
+                for future in cascade:
+                    future.result()
             
             return result.deleted_count > 0
             
-        except Exception as e:
-            print(f"Error deleting user: {e}")
+        except Exception:
+            logger.exception("Error deleting user")
             return False
     
     # Message operations
     def create_message(self, message: Message) -> str:
-        """Create a new message"""
+        """Insert a new message through the batcher and return its ID once it is written"""
         try:
             message_dict = message.to_dict()
-            result = self.db.messages.insert_one(message_dict)
-            return str(result.inserted_id)
+            if message_dict['destruct_at'] is None:
+                message_dict['destruct_at'] = self.NEVER_DESTRUCT
+            return str(self.message_inserts.insert(message_dict).result(self.INSERT_TIMEOUT))
         except Exception as e:
             raise Exception(f"Error creating message: {e}")
     
     def get_message_by_id(self, message_id: str) -> Optional[Dict]:
         """Get message by ID"""
         try:
-            message = self.db.messages.find_one({"_id": ObjectId(message_id)})
-            if message:
-                message['_id'] = str(message['_id'])
-            return message
-        except Exception as e:
-            print(f"Error getting message by ID: {e}")
+            return self.docs.messages.find_one({"_id": ObjectId(message_id)})
+        except Exception:
+            logger.exception("Error getting message by ID")
             return None
     
+    def iter_pending_messages(self, user_id: str) -> Iterator[Dict]:
+        """Stream pending messages for a user"""
+        return self._iter_documents(self.docs.messages.find({
+            "recipient_id": user_id,
+            "is_read": False,
+            "is_deleted": False,
+            "destruct_at": {"$gt": datetime.utcnow()}
+        }).sort("timestamp", 1))
+    
     def get_pending_messages(self, user_id: str) -> List[Dict]:
         """Get pending messages for a user"""
         try:
-            messages = list(self.db.messages.find({
-                "recipient_id": user_id,
-                "is_read": False,
-                "is_deleted": False,
-                "$or": [
-                    {"destruct_at": {"$gt": datetime.utcnow()}},
-                    {"destruct_at": None}
-                ]
-            }).sort("timestamp", 1))
-            
-            for message in messages:
-                message['_id'] = str(message['_id'])
-            
-            return messages
-        except Exception as e:
-            print(f"Error getting pending messages: {e}")
+            return list(self.iter_pending_messages(user_id))
+        except Exception:
+            logger.exception("Error getting pending messages")
             return []
     
     def mark_message_as_read(self, message_id: str):
@@ -234,8 +498,28 @@ class Database:
                 {"_id": ObjectId(message_id)},
                 {"$set": {"is_read": True}}
             )
-        except Exception as e:
-            print(f"Error marking message as read: {e}")
+        except Exception:
+            logger.exception("Error marking message as read")
+    
+    def mark_messages_read_and_delete(self, read_ids: List[str], delete_ids: List[str]):
+        """Mark messages as read and soft-delete read-once ones in a single round-trip"""
+        requests = []
+        if read_ids:
+            requests.append(UpdateMany(
+                {"_id": {"$in": [ObjectId(mid) for mid in read_ids]}},
+                {"$set": {"is_read": True}}
+            ))
+        if delete_ids:
+            requests.append(UpdateMany(
+                {"_id": {"$in": [ObjectId(mid) for mid in delete_ids]}},
+                {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
+            ))
+        if not requests:
+            return
+        try:
+            self.db.messages.bulk_write(requests, ordered=False)
+        except Exception:
+            logger.exception("Error marking messages as read")
     
     def delete_message(self, message_id: str):
         """Delete a message"""
@@ -244,113 +528,137 @@ class Database:
                 {"_id": ObjectId(message_id)},
                 {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
             )
-        except Exception as e:
-            print(f"Error deleting message: {e}")
-    
-    def get_user_recent_messages(self, user_id: str, limit: int = 50) -> List[Dict]:
+        except Exception:
+            logger.exception("Error deleting message")
+    
+    def iter_user_recent_messages(self, user_id: str, limit: int = 50,
+                                  before: Optional[datetime] = None) -> Iterator[Dict]:
+        """Stream user's recent messages for threat analysis, newest first"""
+        query = {
+            "$or": [
+                {"sender_id": user_id},
+                {"recipient_id": user_id}
+            ],
+            "is_deleted": False
+        }
+        if before is not None:
+            query["timestamp"] = {"$lt": before}
+        return self._iter_documents(
+            self.docs.messages.find(query, self.ACTIVITY_FIELDS).sort("timestamp", -1).limit(limit)
+        )
+    
+    def get_user_recent_messages(self, user_id: str, limit: int = 50,
+                                 before: Optional[datetime] = None) -> List[Dict]:
         """Get user's recent messages for threat analysis"""
         try:
-            messages = list(self.db.messages.find({
-                "$or": [
-                    {"sender_id": user_id},
-                    {"recipient_id": user_id}
-                ],
-                "is_deleted": False
-            }).sort("timestamp", -1).limit(limit))
-            
-            for message in messages:
-                message['_id'] = str(message['_id'])
-            
-            return messages
-        except Exception as e:
-            print(f"Error getting user recent messages: {e}")
+            return list(self.iter_user_recent_messages(user_id, limit, before))
+        except Exception:
+            logger.exception("Error getting user recent messages")
             return []
     
+    def iter_conversation_messages(self, user1_id: str, user2_id: str, limit: int = 100) -> Iterator[Dict]:
+        """Stream conversation messages between two users"""
+        return self._iter_documents(self.docs.messages.find({
+            "$or": [
+                {"sender_id": user1_id, "recipient_id": user2_id},
+                {"sender_id": user2_id, "recipient_id": user1_id}
+            ],
+            "is_deleted": False
+        }).sort("timestamp", 1).limit(limit))
+    
     def get_conversation_messages(self, user1_id: str, user2_id: str, limit: int = 100) -> List[Dict]:
         """Get conversation messages between two users"""
         try:
-            messages = list(self.db.messages.find({
-                "$or": [
-                    {"sender_id": user1_id, "recipient_id": user2_id},
-                    {"sender_id": user2_id, "recipient_id": user1_id}
-                ],
-                "is_deleted": False
-            }).sort("timestamp", 1).limit(limit))
-            
-            for message in messages:
-                message['_id'] = str(message['_id'])
-            
-            return messages
-        except Exception as e:
-            print(f"Error getting conversation messages: {e}")
+            return list(self.iter_conversation_messages(user1_id, user2_id, limit))
+        except Exception:
+            logger.exception("Error getting conversation messages")
             return []
     
     def get_message_statistics(self) -> Dict:
         """Get message statistics for admin dashboard"""
         try:
             total_messages = self.db.messages.count_documents({"is_deleted": False})
-            messages_today = self.db.messages.count_documents({
-                "timestamp": {"$gte": datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)},
-                "is_deleted": False
-            })
             
-            # Get messages by hour for the last 24 hours
-            hourly_stats = []
-            for i in range(24):
-                hour_start = datetime.utcnow() - timedelta(hours=i+1)
-                hour_end = datetime.utcnow() - timedelta(hours=i)
-                count = self.db.messages.count_documents({
-                    "timestamp": {"$gte": hour_start, "$lt": hour_end},
+            now = datetime.utcnow()
+            today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+            window_start = now - timedelta(hours=24)
+            
+            # One pass over the last day: today's count plus 24 hour-long buckets,
+            # where bucket i holds timestamps in [now - (i+1)h, now - ih)
+            pipeline = [
+                {"$match": {
+                    "timestamp": {"$gte": min(today_start, window_start)},
                     "is_deleted": False
-                })
-                hourly_stats.append({
-                    "hour": hour_start.hour,
-                    "count": count
-                })
+                }},
+                {"$facet": {
+                    "today": [
+                        {"$match": {"timestamp": {"$gte": today_start}}},
+                        {"$count": "count"}
+                    ],
+                    "hourly": [
+                        {"$match": {"timestamp": {"$gte": window_start, "$lt": now}}},
+                        {"$group": {
+                            "_id": {"$subtract": [
+                                {"$ceil": {"$divide": [{"$subtract": [now, "$timestamp"]}, 3600000]}},
+                                1
+                            ]},
+                            "count": {"$sum": 1}
+                        }}
+                    ]
+                }}
+            ]
+            facets = next(self.db.messages.aggregate(pipeline), {"today": [], "hourly": []})
+            
+            messages_today = facets["today"][0]["count"] if facets["today"] else 0
+            counts_by_hours_ago = {int(bucket["_id"]): bucket["count"] for bucket in facets["hourly"]}
+            
+            # Get messages by hour for the last 24 hours
+            hourly_stats = [
+                {
+                    "hour": (now - timedelta(hours=i+1)).hour,
+                    "count": counts_by_hours_ago.get(i, 0)
+                }
+                for i in range(24)
+            ]
             
             return {
                 "total_messages": total_messages,
                 "messages_today": messages_today,
                 "hourly_stats": hourly_stats
             }
-        except Exception as e:
-            print(f"Error getting message statistics: {e}")
+        except Exception:
+            logger.exception("Error getting message statistics")
             return {"total_messages": 0, "messages_today": 0, "hourly_stats": []}
     
     # Threat log operations
     def create_threat_log(self, threat_log: ThreatLog) -> str:
-        """Create a new threat log"""
+        """Queue a new threat log for a batched insert and return its ID"""
         try:
             threat_dict = threat_log.to_dict()
-            result = self.db.threat_logs.insert_one(threat_dict)
-            return str(result.inserted_id)
+            self.threat_log_inserts.insert(threat_dict)
+            return str(threat_dict['_id'])
         except Exception as e:
             raise Exception(f"Error creating threat log: {e}")
     
     def get_recent_threat_logs(self, limit: int = 20) -> List[Dict]:
         """Get recent threat logs"""
         try:
-            threat_logs = list(self.db.threat_logs.find().sort("timestamp", -1).limit(limit))
-            for log in threat_logs:
-                log['_id'] = str(log['_id'])
+            threat_logs = list(self.docs.threat_logs.find().sort("timestamp", -1).limit(limit))
             return threat_logs
-        except Exception as e:
-            print(f"Error getting recent threat logs: {e}")
+        except Exception:
+            logger.exception("Error getting recent threat logs")
             return []
     
     def get_user_threat_logs(self, user_id: str, limit: int = 10) -> List[Dict]:
         """Get threat logs for a specific user"""
         try:
-            threat_logs = list(self.db.threat_logs.find({
+            threat_logs = list(self.docs.threat_logs.find({
                 "user_id": user_id
             }).sort("timestamp", -1).limit(limit))
             
-            for log in threat_logs:
-                log['_id'] = str(log['_id'])
-            
             return threat_logs
-        except Exception as e:
-            print(f"Error getting user threat logs: {e}")
+        except Exception:
+            logger.exception("Error getting user threat logs")
             return []
     
     # Session key operations
@@ -366,12 +674,9 @@ class Database:
     def get_session_key(self, key_id: str) -> Optional[Dict]:
         """Get session key by ID"""
         try:
-            key = self.db.session_keys.find_one({"key_id": key_id})
-            if key:
-                key['_id'] = str(key['_id'])
-            return key
-        except Exception as e:
-            print(f"Error getting session key: {e}")
+            return self.docs.session_keys.find_one({"key_id": key_id})
+        except Exception:
+            logger.exception("Error getting session key")
             return None
     
     def destroy_session_key(self, key_id: str):
@@ -381,174 +686,174 @@ class Database:
                 {"key_id": key_id},
                 {"$set": {"is_destroyed": True, "destroyed_at": datetime.utcnow()}}
             )
-        except Exception as e:
-            print(f"Error destroying session key: {e}")
-    
-    # Cleanup operations
-    def cleanup_expired_messages(self):
-        """Clean up expired self-destruct messages"""
-        try:
-            result = self.db.messages.update_many(
-                {
-                    "destruct_at": {"$lt": datetime.utcnow()},
-                    "is_deleted": False
-                },
-                {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
-            )
-            return result.modified_count
-        except Exception as e:
-            print(f"Error cleaning up expired messages: {e}")
-            return 0
-    
-    def cleanup_expired_keys(self):
-        """Clean up expired session keys"""
-        try:
-            result = self.db.session_keys.update_many(
-                {
-                    "expires_at": {"$lt": datetime.utcnow()},
-                    "is_destroyed": False
-                },
-                {"$set": {"is_destroyed": True, "destroyed_at": datetime.utcnow()}}
-            )
-            return result.modified_count
-        except Exception as e:
-            print(f"Error cleaning up expired keys: {e}")
-            return 0
+        except Exception:
+            logger.exception("Error destroying session key")
     
     # Group chat operations
     def create_chat_room(self, room: ChatRoom) -> str:
         """Create a new chat room"""
         try:
-            room_dict = room.to_dict()
-            result = self.db.chat_rooms.insert_one(room_dict)
-            return str(result.inserted_id)
+            # The unique join_key index is the collision check; on a clash draw a new key and retry
+            for attempt in range(self.JOIN_KEY_ATTEMPTS):
+                try:
+                    result = self.db.chat_rooms.insert_one(room.to_dict())
+                    return str(result.inserted_id)
+                except DuplicateKeyError as e:
+                    if 'join_key' not in (e.details or {}).get('keyPattern', {}) or attempt == self.JOIN_KEY_ATTEMPTS - 1:
+                        raise
+                    room.join_key = room._generate_join_key()
         except Exception as e:
             raise Exception(f"Error creating chat room: {e}")
     
     def get_chat_room_by_id(self, room_id: str) -> Optional[Dict]:
         """Get chat room by ID"""
         try:
-            room = self.db.chat_rooms.find_one({"_id": ObjectId(room_id)})
-            if room:
-                room['_id'] = str(room['_id'])
-            return room
-        except Exception as e:
-            print(f"Error getting chat room by ID: {e}")
+            return self.docs.chat_rooms.find_one({"_id": _oid(room_id)})
+        except Exception:
+            logger.exception("Error getting chat room by ID")
             return None
     
     def get_chat_room_by_name(self, name: str) -> Optional[Dict]:
         """Get chat room by name"""
         try:
-            room = self.db.chat_rooms.find_one({"name": name})
-            if room:
-                room['_id'] = str(room['_id'])
-            return room
-        except Exception as e:
-            print(f"Error getting chat room by name: {e}")
+            return self.docs.chat_rooms.find_one({"name": name})
+        except Exception:
+            logger.exception("Error getting chat room by name")
             return None
     
     def get_chat_room_by_join_key(self, join_key: str) -> Optional[Dict]:
         """Get chat room by join key"""
         try:
-            room = self.db.chat_rooms.find_one({"join_key": join_key})
-            if room:
-                room['_id'] = str(room['_id'])
-            return room
-        except Exception as e:
-            print(f"Error getting chat room by join key: {e}")
+            return self.docs.chat_rooms.find_one({"join_key": join_key})
+        except Exception:
+            logger.exception("Error getting chat room by join key")
+            return None
+    
+    def get_chat_room_membership(self, user_id: str, room_id: str = None,
+                                 join_key: str = None) -> Optional[Dict]:
+        """Get a chat room by ID or join key with is_member and member_count in place of its member list"""
+        try:
+            query = {"_id": _oid(room_id)} if room_id is not None else {"join_key": join_key}
+            # Computed server-side so a large room's members never cross the wire
+            return self.docs.chat_rooms.find_one(query, {
+                "name": 1,
+                "is_active": 1,
+                "max_members": 1,
+                "is_member": {"$in": [user_id, {"$ifNull": ["$members", []]}]},
+                "member_count": {"$size": {"$ifNull": ["$members", []]}}
+            })
+        except Exception:
+            logger.exception("Error getting chat room membership")
             return None
     
     def get_public_chat_rooms(self) -> List[Dict]:
         """Get all public chat rooms"""
         try:
-            rooms = list(self.db.chat_rooms.find({
+            rooms = list(self.docs.chat_rooms.find({
                 "is_public": True,
                 "is_active": True
             }).sort("created_at", -1))
             
-            for room in rooms:
-                room['_id'] = str(room['_id'])
-            
             return rooms
-        except Exception as e:
-            print(f"Error getting public chat rooms: {e}")
+        except Exception:
+            logger.exception("Error getting public chat rooms")
             return []
     
     def get_user_chat_rooms(self, user_id: str) -> List[Dict]:
         """Get chat rooms where user is a member"""
         try:
-            rooms = list(self.db.chat_rooms.find({
+            rooms = list(self.docs.chat_rooms.find({
                 "members": user_id,
                 "is_active": True
             }).sort("created_at", -1))
             
-            for room in rooms:
-                room['_id'] = str(room['_id'])
+            return rooms
+        except Exception:
+            logger.exception("Error getting user chat rooms")
+            return []
+    
+    def get_visible_chat_rooms(self, user_id: str) -> List[Dict]:
+        """Get public chat rooms and rooms where user is a member, without duplicates"""
+        try:
+            rooms = list(self.docs.chat_rooms.find({
+                "$or": [
+                    {"is_public": True},
+                    {"members": user_id}
+                ],
+                "is_active": True
+            }).sort("created_at", -1))
             
             return rooms
-        except Exception as e:
-            print(f"Error getting user chat rooms: {e}")
+        except Exception:
+            logger.exception("Error getting visible chat rooms")
             return []
     
     def join_chat_room(self, room_id: str, user_id: str) -> bool:
-        """Add user to chat room"""
+        """Add user to chat room if it is active and has space, in one atomic update"""
         try:
-            room = self.get_chat_room_by_id(room_id)
-            if not room:
-                return False
-            
-            if len(room['members']) >= room['max_members']:
-                return False
-            
-            if user_id not in room['members']:
-                result = self.db.chat_rooms.update_one(
-                    {"_id": ObjectId(room_id)},
-                    {"$addToSet": {"members": user_id}}
-                )
-                return result.modified_count > 0
-            
-            return True
-        except Exception as e:
-            print(f"Error joining chat room: {e}")
+            result = self.db.chat_rooms.update_one(
+                {
+                    "_id": _oid(room_id),
+                    "is_active": True,
+                    "members": {"$ne": user_id},
+                    "$expr": {"$lt": [{"$size": "$members"}, "$max_members"]}
+                },
+                {"$addToSet": {"members": user_id}}
+            )
+            if result.modified_count > 0:
+                return True
+            
+            # Nothing changed: succeed only if the user was already a member
+            return self.db.chat_rooms.count_documents(
+                {"_id": _oid(room_id), "members": user_id}, limit=1
+            ) > 0
+        except Exception:
+            logger.exception("Error joining chat room")
             return False
     
     def leave_chat_room(self, room_id: str, user_id: str) -> bool:
         """Remove user from chat room"""
         try:
             result = self.db.chat_rooms.update_one(
-                {"_id": ObjectId(room_id)},
+                {"_id": _oid(room_id)},
                 {"$pull": {"members": user_id}}
             )
             return result.modified_count > 0
-        except Exception as e:
-            print(f"Error leaving chat room: {e}")
+        except Exception:
+            logger.exception("Error leaving chat room")
             return False
     
     def create_group_message(self, message: GroupMessage) -> str:
-        """Create a new group message"""
+        """Insert a new group message through the batcher and return its ID once it is written"""
         try:
             message_dict = message.to_dict()
-            result = self.db.group_messages.insert_one(message_dict)
-            return str(result.inserted_id)
+            return str(self.group_message_inserts.insert(message_dict).result(self.INSERT_TIMEOUT))
         except Exception as e:
             raise Exception(f"Error creating group message: {e}")
     
+    def iter_room_messages(self, room_id: str, limit: int = 100) -> Iterator[Dict]:
+        """Stream messages from a chat room"""
+        return self._iter_documents(self.docs.group_messages.find({
+            "room_id": room_id,
+            "is_deleted": False
+        }).sort("timestamp", -1).limit(limit), batch_size=limit)
+    
     def get_room_messages(self, room_id: str, limit: int = 100) -> List[Dict]:
         """Get messages from a chat room"""
         try:
-            messages = list(self.db.group_messages.find({
-                "room_id": room_id,
-                "is_deleted": False
-            }).sort("timestamp", -1).limit(limit))
-            
-            for message in messages:
-                message['_id'] = str(message['_id'])
-            
-            return messages
-        except Exception as e:
-            print(f"Error getting room messages: {e}")
+            return list(self.iter_room_messages(room_id, limit))
+        except Exception:
+            logger.exception("Error getting room messages")
             return []
     
+    def get_group_message_by_id(self, message_id: str) -> Optional[Dict]:
+        """Get group message by ID"""
+        try:
+            return self.docs.group_messages.find_one({"_id": ObjectId(message_id)})
+        except Exception:
+            logger.exception("Error getting group message by ID")
+            return None
+    
     def delete_group_message(self, message_id: str) -> bool:
         """Delete a group message"""
         try:
@@ -557,11 +862,35 @@ class Database:
                 {"$set": {"is_deleted": True, "deleted_at": datetime.utcnow()}}
             )
             return result.modified_count > 0
-        except Exception as e:
-            print(f"Error deleting group message: {e}")
+        except Exception:
+            logger.exception("Error deleting group message")
             return False
     
     def close(self):
-        """Close database connection"""
-        if self.client:
-            self.client.close()
+        """Close database connection, shared by every Database in this process"""
+        global _client
+        self.message_inserts.flush()
+        self.group_message_inserts.flush()
+        self.threat_log_inserts.flush()
+        with _client_lock:
+            if _client is not None:
+                _client.close()
+                _client = None
+
+class AsyncDatabase:
+    """Awaitable facade over Database for async views; each call runs on a worker thread"""
+    
+    def __init__(self, database: Database):
+        self._database = database
+    
+    def __getattr__(self, name: str):
+        attr = getattr(self._database, name)
+        if not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            return await asyncio.to_thread(attr, *args, **kwargs)
+        
+        call.__name__ = name
+        call.__doc__ = attr.__doc__
+        return call
@@ -4,35 +4,102 @@ Implements AES-256, RSA-4096, and quantum-safe encryption
 """
 
 import os
-import base64
+import binascii
+import ctypes
 import hashlib
+import hmac
+import logging
 from cryptography.hazmat.primitives import hashes, serialization
 from cryptography.hazmat.primitives.asymmetric import rsa, padding
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
 from cryptography.hazmat.backends import default_backend
 from typing import Tuple, Optional
+import queue
 import secrets
+import threading
+import time
+import weakref
+from functools import lru_cache
 import numpy as np
 
+logger = logging.getLogger(__name__)
+
+# Direct C base64 codecs, skipping the base64 module's Python wrappers on the hot paths
+_b64e = binascii.b2a_base64
+_b64d = binascii.a2b_base64
+
+class EncryptionError(Exception):
+    """Raised when an encryption operation fails"""
+
+# OAEP-SHA256 padding for wrapping session keys; stateless, so built once
+RSA_OAEP_PADDING = padding.OAEP(
+    mgf=padding.MGF1(algorithm=hashes.SHA256()),
+    algorithm=hashes.SHA256(),
+    label=None
+)
+
+# Per-thread pool of random bytes that GCM IVs are sliced from, one getrandom() per 4 KiB;
+# tagged with the pid so a forked worker never reuses its parent's unspent bytes
+IV_POOL_SIZE = 4096
+_iv_pool = threading.local()
+
+def _next_iv(length: int = 12) -> bytes:
+    """Take the next random IV from this thread's pool"""
+    pid = os.getpid()
+    offset = getattr(_iv_pool, 'offset', IV_POOL_SIZE)
+    if offset + length > IV_POOL_SIZE or getattr(_iv_pool, 'pid', None) != pid:
+        _iv_pool.buffer = secrets.token_bytes(IV_POOL_SIZE)
+        _iv_pool.pid = pid
+        offset = 0
+    _iv_pool.offset = offset + length
+    return _iv_pool.buffer[offset:offset + length]
+
+# Parsed RSA keys keyed by their base64 PEM; recipients and readers recur across messages,
+# so each key's ASN.1 parse and Montgomery setup happen once instead of per message
+@lru_cache(maxsize=256)
+def _load_public_key(public_key_pem: str):
+    return serialization.load_pem_public_key(_b64d(public_key_pem), backend=default_backend())
+
+@lru_cache(maxsize=256)
+def _load_private_key(private_key_pem: str):
+    return serialization.load_pem_private_key(
+        _b64d(private_key_pem),
+        password=None,
+        backend=default_backend()
+    )
+
 class EncryptionManager:
     """Advanced encryption manager with quantum-safe capabilities"""
     
+    # RSA private keys generated ahead of registrations, shared by every manager in the process;
+    # the refill thread starts on first use so processes that never register users skip it
+    RSA_KEY_POOL_SIZE = 4
+    _rsa_key_pool = queue.Queue(maxsize=RSA_KEY_POOL_SIZE)
+    _rsa_keygen_lock = threading.Lock()
+    _rsa_keygen_thread = None
+    
+    KEY_ROTATION_MIN_INTERVAL = 60  # seconds
+    # Live PerfectForwardSecrecy instances in the process, whose session keys adaptive_key_rotation
+    # replaces; shared by every manager, and weak so registering doesn't keep an instance alive
+    _forward_secrecy = weakref.WeakSet()
+    
     def __init__(self):
         self.backend = default_backend()
         self.aes_key_size = 32  # 256 bits
         self.rsa_key_size = 4096
         self.quantum_key_size = 1024  # Lattice-based simulation
+        self.pbkdf2_iterations = 100000
+        self._last_key_rotation = float('-inf')
     
     def generate_key_pair(self) -> Tuple[str, str]:
         """Generate RSA-4096 key pair"""
         try:
-            # Generate private key
-            private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=self.rsa_key_size,
-                backend=self.backend
-            )
+            # Take a pre-generated private key, or generate one now if the pool is empty
+            self._start_rsa_keygen()
+            try:
+                private_key = self._rsa_key_pool.get_nowait()
+            except queue.Empty:
+                private_key = self._generate_rsa_private_key()
             
             # Get public key
             public_key = private_key.public_key()
@@ -49,10 +116,37 @@ class EncryptionManager:
                 format=serialization.PublicFormat.SubjectPublicKeyInfo
             )
             
-            return base64.b64encode(public_pem).decode('utf-8'), base64.b64encode(private_pem).decode('utf-8')
+            return _b64e(public_pem, newline=False).decode('ascii'), _b64e(private_pem, newline=False).decode('ascii')
             
         except Exception as e:
-            raise Exception(f"Error generating key pair: {e}")
+            raise EncryptionError(f"Error generating key pair: {e}") from e
+    
+    def _generate_rsa_private_key(self):
+        """Generate an RSA-4096 private key"""
+        return rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=self.rsa_key_size,
+            backend=self.backend
+        )
+    
+    def _start_rsa_keygen(self):
+        """Start the background thread that keeps the RSA key pool full"""
+        if EncryptionManager._rsa_keygen_thread is not None:
+            return
+        with EncryptionManager._rsa_keygen_lock:
+            if EncryptionManager._rsa_keygen_thread is None:
+                thread = threading.Thread(target=self._rsa_keygen_worker, daemon=True)
+                thread.start()
+                EncryptionManager._rsa_keygen_thread = thread
+    
+    def _rsa_keygen_worker(self):
+        """Refill the RSA key pool; put() blocks while the pool is full"""
+        while True:
+            try:
+                self._rsa_key_pool.put(self._generate_rsa_private_key())
+            except Exception:
+                logger.exception("Error pre-generating RSA key")
+                time.sleep(1)
     
     def generate_aes_key(self) -> bytes:
         """Generate random AES-256 key"""
@@ -79,7 +173,7 @@ class EncryptionManager:
             return encrypted_message, encrypted_session_key
             
         except Exception as e:
-            raise Exception(f"Error encrypting message: {e}")
+            raise EncryptionError(f"Error encrypting message: {e}") from e
     
     def decrypt_message(self, encrypted_message: str, encrypted_session_key: str, 
                        recipient_private_key: str) -> str:
@@ -94,230 +188,185 @@ class EncryptionManager:
             return decrypted_message.decode('utf-8')
             
         except Exception as e:
-            raise Exception(f"Error decrypting message: {e}")
+            raise EncryptionError(f"Error decrypting message: {e}") from e
     
     def _aes_encrypt(self, data: bytes, key: bytes) -> str:
-        """Encrypt data with AES-256-GCM"""
-        try:
-            # Generate random IV
-            iv = secrets.token_bytes(12)  # 96-bit IV for GCM
-            
-            # Create cipher
-            cipher = Cipher(
-                algorithms.AES(key),
-                modes.GCM(iv),
-                backend=self.backend
-            )
-            
-            # Encrypt
-            encryptor = cipher.encryptor()
-            ciphertext = encryptor.update(data) + encryptor.finalize()
-            
-            # Combine IV, tag, and ciphertext
-            encrypted_data = iv + encryptor.tag + ciphertext
-            
-            return base64.b64encode(encrypted_data).decode('utf-8')
-            
-        except Exception as e:
-            raise Exception(f"Error in AES encryption: {e}")
+        """Encrypt data with AES-256-GCM, base64-encoded for storage"""
+        return _b64e(self._aes_encrypt_raw(data, key), newline=False).decode('ascii')
+    
+    def _aes_encrypt_raw(self, data: bytes, key: bytes) -> bytes:
+        """Encrypt data with AES-256-GCM into raw IV + tag + ciphertext bytes"""
+        # Generate random IV
+        iv = _next_iv(12)  # 96-bit IV for GCM
+        
+        # Encrypt with the one-shot AEAD interface; it returns ciphertext + tag
+        sealed = AESGCM(key).encrypt(iv, data, None)
+        
+        # Combine IV, tag, and ciphertext (the stored layout)
+        return iv + sealed[-16:] + sealed[:-16]
     
     def _aes_decrypt(self, encrypted_data: str, key: bytes) -> bytes:
-        """Decrypt data with AES-256-GCM"""
-        try:
-            # Decode base64
-            encrypted_bytes = base64.b64decode(encrypted_data)
-            
-            # Extract IV, tag, and ciphertext
-            iv = encrypted_bytes[:12]
-            tag = encrypted_bytes[12:28]
-            ciphertext = encrypted_bytes[28:]
-            
-            # Create cipher
-            cipher = Cipher(
-                algorithms.AES(key),
-                modes.GCM(iv, tag),
-                backend=self.backend
-            )
-            
-            # Decrypt
-            decryptor = cipher.decryptor()
-            plaintext = decryptor.update(ciphertext) + decryptor.finalize()
-            
-            return plaintext
-            
-        except Exception as e:
-            raise Exception(f"Error in AES decryption: {e}")
+        """Decrypt base64-encoded AES-256-GCM data"""
+        return self._aes_decrypt_raw(_b64d(encrypted_data), key)
+    
+    def _aes_decrypt_raw(self, encrypted_bytes: bytes, key: bytes) -> bytes:
+        """Decrypt raw IV + tag + ciphertext bytes with AES-256-GCM"""
+        # Extract IV, tag, and ciphertext
+        iv = encrypted_bytes[:12]
+        tag = encrypted_bytes[12:28]
+        ciphertext = encrypted_bytes[28:]
+        
+        # Decrypt and verify the tag in one call
+        plaintext = AESGCM(key).decrypt(iv, ciphertext + tag, None)
+        
+        return plaintext
     
     def _rsa_encrypt(self, data: bytes, public_key_pem: str) -> str:
         """Encrypt data with RSA public key"""
         try:
             # Decode public key
-            public_key_bytes = base64.b64decode(public_key_pem)
-            public_key = serialization.load_pem_public_key(
-                public_key_bytes,
-                backend=self.backend
-            )
+            public_key = _load_public_key(public_key_pem)
             
             # Encrypt
             encrypted_data = public_key.encrypt(
                 data,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
+                RSA_OAEP_PADDING
             )
             
-            return base64.b64encode(encrypted_data).decode('utf-8')
+            return _b64e(encrypted_data, newline=False).decode('ascii')
             
         except Exception as e:
-            raise Exception(f"Error in RSA encryption: {e}")
+            raise EncryptionError(f"Error in RSA encryption: {e}") from e
     
     def _rsa_decrypt(self, encrypted_data: str, private_key_pem: str) -> bytes:
         """Decrypt data with RSA private key"""
         try:
             # Decode private key
-            private_key_bytes = base64.b64decode(private_key_pem)
-            private_key = serialization.load_pem_private_key(
-                private_key_bytes,
-                password=None,
-                backend=self.backend
-            )
+            private_key = _load_private_key(private_key_pem)
             
             # Decode encrypted data
-            encrypted_bytes = base64.b64decode(encrypted_data)
+            encrypted_bytes = _b64d(encrypted_data)
             
             # Decrypt
             decrypted_data = private_key.decrypt(
                 encrypted_bytes,
-                padding.OAEP(
-                    mgf=padding.MGF1(algorithm=hashes.SHA256()),
-                    algorithm=hashes.SHA256(),
-                    label=None
-                )
+                RSA_OAEP_PADDING
             )
             
             return decrypted_data
             
         except Exception as e:
-            raise Exception(f"Error in RSA decryption: {e}")
+            raise EncryptionError(f"Error in RSA decryption: {e}") from e
     
     def quantum_safe_encrypt(self, message: str, quantum_key: bytes) -> str:
-        """Simulate quantum-safe encryption using lattice-based cryptography"""
+        """Encrypt with ChaCha20-Poly1305 under the quantum-safe key"""
         try:
-            # Convert message to bytes
-            message_bytes = message.encode('utf-8')
-            
-            # Pad message to key size
-            padded_message = message_bytes.ljust(len(quantum_key), b'\x00')
-            
-            # Simulate lattice-based encryption (XOR with key for simplicity)
-            # In production, use actual post-quantum algorithms like Kyber
-            encrypted = bytes(a ^ b for a, b in zip(padded_message, quantum_key))
+            # 256-bit symmetric keys keep a 128-bit margin against Grover's algorithm;
+            # in production, pair with a post-quantum KEM like Kyber for key exchange
+            nonce = secrets.token_bytes(12)
+            encrypted = ChaCha20Poly1305(quantum_key[:32]).encrypt(nonce, message.encode('utf-8'), None)
             
-            return base64.b64encode(encrypted).decode('utf-8')
+            return _b64e(nonce + encrypted, newline=False).decode('ascii')
             
         except Exception as e:
-            raise Exception(f"Error in quantum-safe encryption: {e}")
+            raise EncryptionError(f"Error in quantum-safe encryption: {e}") from e
     
     def quantum_safe_decrypt(self, encrypted_message: str, quantum_key: bytes) -> str:
-        """Simulate quantum-safe decryption"""
+        """Decrypt and authenticate a quantum-safe ciphertext"""
         try:
             # Decode base64
-            encrypted_bytes = base64.b64decode(encrypted_message)
+            encrypted_bytes = _b64d(encrypted_message)
             
-            # Simulate lattice-based decryption (XOR with key)
-            decrypted = bytes(a ^ b for a, b in zip(encrypted_bytes, quantum_key))
-            
-            # Remove padding
-            decrypted = decrypted.rstrip(b'\x00')
+            # Split nonce from ciphertext + tag
+            nonce = encrypted_bytes[:12]
+            decrypted = ChaCha20Poly1305(quantum_key[:32]).decrypt(nonce, encrypted_bytes[12:], None)
             
             return decrypted.decode('utf-8')
             
         except Exception as e:
-            raise Exception(f"Error in quantum-safe decryption: {e}")
+            raise EncryptionError(f"Error in quantum-safe decryption: {e}") from e
     
     def generate_derived_key(self, password: str, salt: bytes) -> bytes:
         """Generate key from password using PBKDF2"""
         try:
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=self.aes_key_size,
-                salt=salt,
-                iterations=100000,
-                backend=self.backend
+            return hashlib.pbkdf2_hmac(
+                'sha256', password.encode('utf-8'), salt, self.pbkdf2_iterations, self.aes_key_size
             )
             
-            return kdf.derive(password.encode('utf-8'))
-            
         except Exception as e:
-            raise Exception(f"Error generating derived key: {e}")
+            raise EncryptionError(f"Error generating derived key: {e}") from e
     
     def secure_hash(self, data: str) -> str:
         """Generate secure hash using SHA-256"""
-        try:
-            hash_object = hashlib.sha256(data.encode('utf-8'))
-            return hash_object.hexdigest()
-            
-        except Exception as e:
-            raise Exception(f"Error generating hash: {e}")
+        hash_object = hashlib.sha256(data.encode('utf-8'))
+        return hash_object.hexdigest()
     
     def destroy_key(self, key_data: str):
         """Securely destroy key data"""
         try:
-            # Overwrite key data with random bytes
-            if isinstance(key_data, str):
-                key_bytes = key_data.encode('utf-8')
-            else:
-                key_bytes = key_data
-            
-            # Overwrite multiple times
-            for _ in range(3):
-                random_data = secrets.token_bytes(len(key_bytes))
-                key_bytes = random_data
+            # Only a mutable buffer can be wiped in place; str and bytes are immutable,
+            # so for those dropping the reference is all that can be done
+            if isinstance(key_data, bytearray) and key_data:
+                length = len(key_data)
+                address = ctypes.addressof(ctypes.c_char.from_buffer(key_data))
+                
+                # Overwrite with random bytes, then zero
+                for _ in range(3):
+                    ctypes.memmove(address, secrets.token_bytes(length), length)
+                ctypes.memset(address, 0, length)
             
             # Clear memory
-            del key_bytes
+            del key_data
             
-        except Exception as e:
-            print(f"Error destroying key: {e}")
+        except Exception:
+            logger.exception("Error destroying key")
+    
+    def destroy_keys(self, keys):
+        """Securely destroy several keys"""
+        for key_data in keys:
+            self.destroy_key(key_data)
     
     def verify_integrity(self, data: str, hash_value: str) -> bool:
         """Verify data integrity using hash"""
         try:
-            computed_hash = self.secure_hash(data)
-            return computed_hash == hash_value
+            # Compare raw digests in constant time
+            computed_digest = hashlib.sha256(data.encode('utf-8')).digest()
+            return hmac.compare_digest(computed_digest, bytes.fromhex(hash_value))
             
-        except Exception as e:
-            print(f"Error verifying integrity: {e}")
+        except Exception:
+            logger.exception("Error verifying integrity")
             return False
     
     def generate_secure_random(self, length: int) -> str:
         """Generate cryptographically secure random string"""
-        try:
-            random_bytes = secrets.token_bytes(length)
-            return base64.b64encode(random_bytes).decode('utf-8')
-            
-        except Exception as e:
-            raise Exception(f"Error generating secure random: {e}")
+        random_bytes = secrets.token_bytes(length)
+        return _b64e(random_bytes, newline=False).decode('ascii')
     
     def adaptive_key_rotation(self, threat_level: float) -> bool:
         """Adaptive key rotation based on threat level"""
+        # Common case: nothing to do
+        if threat_level <= 70:
+            return False
+        
+        # Don't thrash when the threat level oscillates around the threshold
+        now = time.monotonic()
+        if now - self._last_key_rotation < self.KEY_ROTATION_MIN_INTERVAL:
+            return False
+        self._last_key_rotation = now
+        
         try:
-            # Rotate keys if threat level is high
-            if threat_level > 70:
-                # Generate new quantum-safe key
-                new_quantum_key = self.generate_quantum_safe_key()
-                
-                # In production, this would trigger key rotation across the system
-                print(f"High threat detected ({threat_level}): Initiating key rotation")
-                
-                return True
+            # Generate new quantum-safe key
+            new_quantum_key = self.generate_quantum_safe_key()
             
-            return False
+            # In production, this would trigger key rotation across the system
+            logger.warning("High threat detected (%s): Initiating key rotation", threat_level)
+            for forward_secrecy in list(EncryptionManager._forward_secrecy):
+                forward_secrecy.rotate_all_session_keys()
             
-        except Exception as e:
-            print(f"Error in adaptive key rotation: {e}")
+            return True
+            
+        except Exception:
+            logger.exception("Error in adaptive key rotation")
             return False
 
 # Quantum-safe encryption simulation
@@ -327,40 +376,50 @@ class QuantumSafeEncryption:
     def __init__(self):
         self.lattice_dimension = 256
         self.error_distribution = 0.1
+        # Per-instance PCG64 generator instead of the global, lock-shared legacy RandomState
+        self.rng = np.random.default_rng()
     
     def generate_lattice_key(self) -> Tuple[np.ndarray, np.ndarray]:
         """Generate lattice-based key pair (simplified simulation)"""
         try:
             # Generate random lattice basis
-            secret_key = np.random.randint(-1, 2, self.lattice_dimension)
-            public_key = np.random.randint(0, 2**16, self.lattice_dimension)
+            secret_key = self.rng.integers(-1, 2, self.lattice_dimension, dtype=np.int8)
+            public_key = self.rng.integers(0, 2**16, self.lattice_dimension, dtype=np.uint16)
             
             return secret_key, public_key
             
         except Exception as e:
-            raise Exception(f"Error generating lattice key: {e}")
+            raise EncryptionError(f"Error generating lattice key: {e}") from e
     
     def lattice_encrypt(self, message: str, public_key: np.ndarray) -> np.ndarray:
         """Encrypt message using lattice-based encryption (simulation)"""
         try:
-            # Convert message to binary
-            message_bits = ''.join(format(ord(c), '08b') for c in message)
-            message_vector = np.array([int(bit) for bit in message_bits])
+            # Convert message to binary, most significant bit first
+            message_vector = np.unpackbits(
+                np.frombuffer(message.encode('utf-8'), dtype=np.uint8)
+            )[:self.lattice_dimension]
             
             # Pad to lattice dimension
             if len(message_vector) < self.lattice_dimension:
                 message_vector = np.pad(message_vector, (0, self.lattice_dimension - len(message_vector)))
-            else:
-                message_vector = message_vector[:self.lattice_dimension]
             
-            # Simulate lattice encryption
-            noise = np.random.normal(0, self.error_distribution, self.lattice_dimension)
-            ciphertext = (public_key * message_vector + noise) % 2**16
+            # Simulate lattice encryption; the noise is rounded onto the integer lattice,
+            # so reducing mod 2**16 is a bit mask rather than a floating-point modulo
+            noise = self.rng.standard_normal(self.lattice_dimension, dtype=np.float32)
+            noise *= self.error_distribution
+            noise = np.rint(noise).astype(np.int32)
+            
+            # public_key * message + noise, reduced in place in one int32 buffer; wide
+            # enough for the sum and for negative noise, which the mask wraps mod 2**16
+            ciphertext = np.empty(self.lattice_dimension, dtype=np.int32)
+            np.multiply(public_key, message_vector, out=ciphertext)
+            np.add(ciphertext, noise, out=ciphertext)
+            np.bitwise_and(ciphertext, 0xFFFF, out=ciphertext)
             
-            return ciphertext
+            return ciphertext.astype(np.uint16)
             
         except Exception as e:
-            raise Exception(f"Error in lattice encryption: {e}")
+            raise EncryptionError(f"Error in lattice encryption: {e}") from e
     
     def lattice_decrypt(self, ciphertext: np.ndarray, secret_key: np.ndarray) -> str:
         """Decrypt message using lattice-based decryption (simulation)"""
@@ -369,40 +428,107 @@ class QuantumSafeEncryption:
             decrypted_vector = (ciphertext * secret_key) % 2
             
             # Convert back to string
-            binary_string = ''.join(map(str, decrypted_vector))
-            message = ''.join(chr(int(binary_string[i:i+8], 2)) for i in range(0, len(binary_string), 8))
+            message = np.packbits(decrypted_vector.astype(np.uint8)).tobytes().decode('utf-8', 'ignore')
             
             return message.rstrip('\x00')
             
         except Exception as e:
-            raise Exception(f"Error in lattice decryption: {e}")
+            raise EncryptionError(f"Error in lattice decryption: {e}") from e
+
+# Contiguous session key storage
+class SessionKeyStore:
+    """Session keys stored as rows of one uint8 array, indexed by session ID"""
+    
+    INITIAL_CAPACITY = 64
+    
+    def __init__(self, key_size: int = 32):
+        self.key_size = key_size
+        self.lock = threading.Lock()
+        self._keys = np.zeros((self.INITIAL_CAPACITY, key_size), dtype=np.uint8)
+        self._slots = {}
+        self._free_slots = list(range(self.INITIAL_CAPACITY - 1, -1, -1))
+    
+    def get(self, session_id: str) -> Optional[bytes]:
+        """Get a session's key; call with lock held"""
+        slot = self._slots.get(session_id)
+        return None if slot is None else self._keys[slot].tobytes()
+    
+    def put(self, session_id: str, key: bytes):
+        """Store a session's key, reusing its slot if it has one; call with lock held"""
+        slot = self._slots.get(session_id)
+        if slot is None:
+            if not self._free_slots:
+                self._grow()
+            slot = self._free_slots.pop()
+            self._slots[session_id] = slot
+        self._keys[slot] = np.frombuffer(key, dtype=np.uint8)
+    
+    def destroy(self, session_id: str) -> bool:
+        """Zero a session's key and free its slot; call with lock held"""
+        slot = self._slots.pop(session_id, None)
+        if slot is None:
+            return False
+        self._keys[slot] = 0
+        self._free_slots.append(slot)
+        return True
+    
+    def rotate_all(self):
+        """Replace every stored key with fresh random bytes in one draw; call with lock held"""
+        rows = len(self._keys)
+        self._keys[:] = np.frombuffer(secrets.token_bytes(self._keys.nbytes), dtype=np.uint8).reshape(rows, self.key_size)
+    
+    def _grow(self):
+        """Double capacity, zeroing the old array so no key copy is left behind"""
+        old_keys = self._keys
+        capacity = len(old_keys)
+        self._keys = np.zeros((capacity * 2, self.key_size), dtype=np.uint8)
+        self._keys[:capacity] = old_keys
+        old_keys[:] = 0
+        self._free_slots.extend(range(capacity * 2 - 1, capacity - 1, -1))
 
 # Perfect Forward Secrecy implementation
 class PerfectForwardSecrecy:
     """Implement perfect forward secrecy for message encryption"""
     
+    SESSION_SHARDS = 16  # power of two, so a mask picks the shard
+    
     def __init__(self):
         self.encryption_manager = EncryptionManager()
-        self.session_keys = {}
+        # Session keys split across shards with a lock each, so concurrent sessions
+        # only contend when they hash to the same shard
+        self._session_shards = [
+            SessionKeyStore(self.encryption_manager.aes_key_size) for _ in range(self.SESSION_SHARDS)
+        ]
+        EncryptionManager._forward_secrecy.add(self)
+    
+    def _shard(self, session_id: str) -> SessionKeyStore:
+        """Shard holding a session's key"""
+        return self._session_shards[hash(session_id) & (self.SESSION_SHARDS - 1)]
     
     def generate_ephemeral_key(self, session_id: str) -> str:
         """Generate ephemeral key for session"""
         try:
             ephemeral_key = self.encryption_manager.generate_aes_key()
-            self.session_keys[session_id] = ephemeral_key
+            shard = self._shard(session_id)
+            with shard.lock:
+                shard.put(session_id, ephemeral_key)
             
-            return base64.b64encode(ephemeral_key).decode('utf-8')
+            return _b64e(ephemeral_key, newline=False).decode('ascii')
             
         except Exception as e:
-            raise Exception(f"Error generating ephemeral key: {e}")
+            raise EncryptionError(f"Error generating ephemeral key: {e}") from e
     
     def encrypt_with_ephemeral_key(self, message: str, session_id: str) -> str:
         """Encrypt message with ephemeral key"""
         try:
-            if session_id not in self.session_keys:
-                self.generate_ephemeral_key(session_id)
-            
-            ephemeral_key = self.session_keys[session_id]
+            shard = self._shard(session_id)
+            with shard.lock:
+                ephemeral_key = shard.get(session_id)
+                if ephemeral_key is None:
+                    ephemeral_key = self.encryption_manager.generate_aes_key()
+                    shard.put(session_id, ephemeral_key)
+            
+            # AES-GCM runs outside the lock and releases the GIL in OpenSSL
             encrypted_message = self.encryption_manager._aes_encrypt(
                 message.encode('utf-8'), ephemeral_key
             )
@@ -410,15 +536,17 @@ class PerfectForwardSecrecy:
             return encrypted_message
             
         except Exception as e:
-            raise Exception(f"Error encrypting with ephemeral key: {e}")
+            raise EncryptionError(f"Error encrypting with ephemeral key: {e}") from e
     
     def decrypt_with_ephemeral_key(self, encrypted_message: str, session_id: str) -> str:
         """Decrypt message with ephemeral key"""
         try:
-            if session_id not in self.session_keys:
-                raise Exception("Session key not found")
+            shard = self._shard(session_id)
+            with shard.lock:
+                ephemeral_key = shard.get(session_id)
+            if ephemeral_key is None:
+                raise EncryptionError("Session key not found")
             
-            ephemeral_key = self.session_keys[session_id]
             decrypted_message = self.encryption_manager._aes_decrypt(
                 encrypted_message, ephemeral_key
             )
@@ -426,14 +554,20 @@ class PerfectForwardSecrecy:
             return decrypted_message.decode('utf-8')
             
         except Exception as e:
-            raise Exception(f"Error decrypting with ephemeral key: {e}")
+            raise EncryptionError(f"Error decrypting with ephemeral key: {e}") from e
+    
+    def rotate_all_session_keys(self):
+        """Replace every session's key at once, e.g. when the threat level spikes"""
+        for shard in self._session_shards:
+            with shard.lock:
+                shard.rotate_all()
     
     def destroy_session_key(self, session_id: str):
         """Destroy ephemeral key for perfect forward secrecy"""
         try:
-            if session_id in self.session_keys:
-                self.encryption_manager.destroy_key(self.session_keys[session_id])
-                del self.session_keys[session_id]
+            shard = self._shard(session_id)
+            with shard.lock:
+                shard.destroy(session_id)
                 
-        except Exception as e:
-            print(f"Error destroying session key: {e}")
+        except Exception:
+            logger.exception("Error destroying session key")
@@ -0,0 +1,9 @@
+"""
+TacticalLink Gunicorn Settings
+Hooks gunicorn picks up from the working directory alongside the Procfile flags
+"""
+
+def worker_exit(server, worker):
+    """Write out a web worker's batched inserts before the process exits"""
+    from app import db
+    db.close()
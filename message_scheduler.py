@@ -3,48 +3,105 @@ TacticalLink Message Scheduler
 Handles self-destructing messages and automatic cleanup
 """
 
+import heapq
+import logging
 import threading
 import time
-import schedule
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional
 import uuid
+from dataclasses import dataclass
+from bson import ObjectId
+from pymongo import UpdateOne
 from database import Database
 from encryption import EncryptionManager
 
+logger = logging.getLogger(__name__)
+
+# Slotted: the scheduler reads these fields for every due task
+@dataclass(slots=True, eq=False)
+class DestructionTask:
+    """A message scheduled for self-destruction"""
+    
+    message_id: str
+    destruct_at: datetime
+    read_once: bool
+    created_at: datetime
+    status: str = 'scheduled'
+    # The message fields destruction needs, when known up front; saves reading them back
+    message: Optional[Dict] = None
+
 class MessageScheduler:
     """Scheduler for self-destructing messages and cleanup tasks"""
     
+    # Server-side limit on cleanup reads, so stop() is never stuck behind a slow query
+    QUERY_MAX_TIME_MS = 4000
+    
+    # Message fields needed to destroy a message and log it, without the ciphertext
+    DESTRUCTION_FIELDS = {
+        'session_key': 1,
+        'sender_id': 1,
+        'recipient_id': 1,
+        'self_destruct_time': 1,
+        'read_once': 1,
+        'content_length': {'$strLenCP': {'$ifNull': ['$content', '']}}
+    }
+    
+    # The database is the source of truth for destruct_at; each instance caches only the
+    # destructions due within LOOKAHEAD, refilled every minute from a capped query
+    LOOKAHEAD = timedelta(minutes=5)
+    LOOKAHEAD_LIMIT = 1024
+    # How long a claim keeps other instances off a message; a crashed claimant's
+    # messages are picked up again once it lapses
+    CLAIM_LEASE = timedelta(minutes=1)
+    
+    # Retention deletes run in bounded batches with a pause between them
+    RETENTION_DELETE_BATCH = 10000
+    RETENTION_DELETE_PAUSE = 0.05
+    
     def __init__(self):
         self.db = Database()
+        # Collection handles, resolved once instead of on every call
+        self._msgs = self.db.db.messages
+        self._keys = self.db.db.session_keys
+        self._threats = self.db.db.threat_logs
+        self._syslogs = self.db.db.system_logs
         self.encryption_manager = EncryptionManager()
+        self.instance_id = uuid.uuid4().hex
         self.scheduled_messages = {}
         self.running = False
-        self.cleanup_thread = None
         self.scheduler_thread = None
         
-        # Schedule cleanup tasks
-        self._setup_cleanup_schedules()
-    
-    def _setup_cleanup_schedules(self):
-        """Setup automatic cleanup schedules"""
-        try:
+        # Min-heap of (destruct_at, message_id); cancelled or rescheduled entries are left
+        # in place and skipped when popped, with scheduled_messages as the source of truth
+        self._destruction_heap = []
+        # Guards scheduled_messages and the heap; never held across database calls
+        self._lock = threading.Lock()
+        # Held while expired messages are cleaned up; force_cleanup can run it from another thread
+        self._cleanup_in_progress = threading.Lock()
+        
+        # The scheduler loop sleeps until the nearest destruction or cleanup job;
+        # setting _wake interrupts the sleep when a sooner deadline arrives
+        self._wake = threading.Event()
+        
+        # Cleanup jobs as [next_run, interval, task], run from the same loop as destructions.
+        # Expired session keys need no job: the expires_at TTL index deletes them server-side
+        now = datetime.utcnow()
+        self._cleanup_jobs = [
+            # Refill the destruction heap from the database, starting right away
+            [now, timedelta(minutes=1), self._load_upcoming_destructions],
             # Clean up expired messages every minute
-            schedule.every().minute.do(self._cleanup_expired_messages)
-            
-            # Clean up expired session keys every 5 minutes
-            schedule.every(5).minutes.do(self._cleanup_expired_keys)
-            
+            [now + timedelta(minutes=1), timedelta(minutes=1), self._cleanup_expired_messages],
             # Clean up old threat logs every hour
-            schedule.every().hour.do(self._cleanup_old_threat_logs)
-            
-            # Clean up old system logs every day
-            schedule.every().day.at("02:00").do(self._cleanup_old_system_logs)
-            
-            print("Cleanup schedules configured")
-            
-        except Exception as e:
-            print(f"Error setting up cleanup schedules: {e}")
+            [now + timedelta(hours=1), timedelta(hours=1), self._cleanup_old_threat_logs],
+            # Clean up old system logs every day at 02:00 UTC
+            [self._next_daily_run(now, 2), timedelta(days=1), self._cleanup_old_system_logs]
+        ]
+    
+    def _next_daily_run(self, now: datetime, hour: int) -> datetime:
+        """Next time the clock reads hour:00"""
+        run_at = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+        return run_at if run_at > now else run_at + timedelta(days=1)
     
     def start(self):
         """Start the message scheduler"""
@@ -58,78 +115,111 @@ class MessageScheduler:
             self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
             self.scheduler_thread.start()
             
-            # Start cleanup thread
-            self.cleanup_thread = threading.Thread(target=self._run_cleanup, daemon=True)
-            self.cleanup_thread.start()
-            
-            print("Message scheduler started")
+            logger.info("Message scheduler started")
             
-        except Exception as e:
-            print(f"Error starting message scheduler: {e}")
+        except Exception:
+            logger.exception("Error starting message scheduler")
     
     def stop(self):
         """Stop the message scheduler"""
         try:
             self.running = False
+            # Interrupt the loop's sleep so it sees running is False right away
+            self._wake.set()
             
             if self.scheduler_thread and self.scheduler_thread.is_alive():
                 self.scheduler_thread.join(timeout=5)
             
-            if self.cleanup_thread and self.cleanup_thread.is_alive():
-                self.cleanup_thread.join(timeout=5)
+            logger.info("Message scheduler stopped")
             
-            print("Message scheduler stopped")
-            
-        except Exception as e:
-            print(f"Error stopping message scheduler: {e}")
+        except Exception:
+            logger.exception("Error stopping message scheduler")
     
-    def schedule_destruction(self, message_id: str, destruct_time: int, read_once: bool = False):
-        """Schedule message for self-destruction"""
+    def schedule_destruction(self, message_id: str, destruct_time: int, read_once: bool = False,
+                             message: Optional[Dict] = None):
+        """Schedule message for self-destruction; message carries the fields in DESTRUCTION_FIELDS"""
         try:
             # Calculate destruction time
-            destruct_at = datetime.utcnow() + timedelta(seconds=destruct_time)
-            
-            # Create destruction task
-            destruction_task = {
-                'message_id': message_id,
-                'destruct_at': destruct_at,
-                'read_once': read_once,
-                'created_at': datetime.utcnow(),
-                'status': 'scheduled'
-            }
+            now = datetime.utcnow()
+            destruct_at = now + timedelta(seconds=destruct_time)
             
-            # Store in memory for quick access
-            self.scheduled_messages[message_id] = destruction_task
-            
-            # Update database
-            from bson import ObjectId
-            self.db.db.messages.update_one(
+            # Update database; whichever instance's scheduler loads it will destroy it
+            self._msgs.update_one(
                 {'_id': ObjectId(message_id)},
                 {'$set': {'destruct_at': destruct_at}}
             )
             
-            print(f"Scheduled message {message_id} for destruction at {destruct_at}")
+            # Cache it locally only if this instance's loop is running and would load it anyway
+            if self.running and destruct_at < now + self.LOOKAHEAD:
+                self._cache_destruction(
+                    DestructionTask(message_id, destruct_at, read_once, now, message=message)
+                )
             
-        except Exception as e:
-            print(f"Error scheduling message destruction: {e}")
+            logger.debug("Scheduled message %s for destruction at %s", message_id, destruct_at)
+            
+        except Exception:
+            logger.exception("Error scheduling message destruction")
     
     def cancel_destruction(self, message_id: str):
         """Cancel scheduled message destruction"""
         try:
-            if message_id in self.scheduled_messages:
-                del self.scheduled_messages[message_id]
+            with self._lock:
+                self.scheduled_messages.pop(message_id, None)
             
             # Update database
-            from bson import ObjectId
-            self.db.db.messages.update_one(
+            self._msgs.update_one(
                 {'_id': ObjectId(message_id)},
-                {'$unset': {'destruct_at': 1}}
+                {'$set': {'destruct_at': self.db.NEVER_DESTRUCT}}
             )
             
-            print(f"Cancelled destruction for message {message_id}")
+            logger.debug("Cancelled destruction for message %s", message_id)
             
-        except Exception as e:
-            print(f"Error cancelling message destruction: {e}")
+        except Exception:
+            logger.exception("Error cancelling message destruction")
+    
+    def _cache_destruction(self, task: DestructionTask):
+        """Add a destruction to the in-memory schedule, waking the loop if it is now the nearest"""
+        with self._lock:
+            self.scheduled_messages[task.message_id] = task
+            heapq.heappush(self._destruction_heap, (task.destruct_at, task.message_id))
+            is_nearest = self._destruction_heap[0][1] == task.message_id
+        
+        if is_nearest:
+            self._wake.set()
+    
+    def _load_upcoming_destructions(self):
+        """Cache the destructions due within the lookahead window from the database"""
+        try:
+            current_time = datetime.utcnow()
+            
+            # Materialise before taking the lock; the lock is never held across database calls
+            upcoming = list(self._msgs.find(
+                {'destruct_at': {'$lt': current_time + self.LOOKAHEAD}, 'is_deleted': False},
+                dict(self.DESTRUCTION_FIELDS, destruct_at=1)
+            ).sort('destruct_at', 1).limit(self.LOOKAHEAD_LIMIT).max_time_ms(self.QUERY_MAX_TIME_MS))
+            
+            with self._lock:
+                for message in upcoming:
+                    message_id = str(message['_id'])
+                    task = self.scheduled_messages.get(message_id)
+                    if task is not None and task.destruct_at == message['destruct_at']:
+                        continue
+                    self.scheduled_messages[message_id] = DestructionTask(
+                        message_id, message['destruct_at'], message.get('read_once', False), current_time,
+                        message=message
+                    )
+                    heapq.heappush(self._destruction_heap, (message['destruct_at'], message_id))
+                    
+        except Exception:
+            logger.exception("Error loading upcoming destructions")
+    
+    def _claim_filter(self, current_time: datetime) -> Dict:
+        """Match messages no other instance holds a live claim on"""
+        return {'$or': [
+            {'claimed_by': None},
+            {'claimed_by': self.instance_id},
+            {'claim_expires_at': {'$lt': current_time}}
+        ]}
     
     def _run_scheduler(self):
         """Main scheduler loop"""
@@ -138,218 +228,287 @@ class MessageScheduler:
                 # Check for messages that need to be destroyed
                 self._check_scheduled_destructions()
                 
-                # Run scheduled tasks
-                schedule.run_pending()
+                # Run cleanup jobs that are due
+                self._run_due_cleanups()
                 
-                # Sleep for 1 second
-                time.sleep(1)
+                # Sleep until the nearest destruction or cleanup job, or until woken
+                self._wake.wait(self._seconds_until_next_deadline())
+                self._wake.clear()
                 
-        except Exception as e:
-            print(f"Error in scheduler loop: {e}")
+        except Exception:
+            logger.exception("Error in scheduler loop")
     
-    def _run_cleanup(self):
-        """Main cleanup loop"""
-        try:
-            while self.running:
-                # Clean up expired messages
-                self._cleanup_expired_messages()
-                
-                # Clean up expired keys
-                self._cleanup_expired_keys()
-                
-                # Sleep for 30 seconds
-                time.sleep(30)
-                
-        except Exception as e:
-            print(f"Error in cleanup loop: {e}")
+    def _seconds_until_next_deadline(self) -> float:
+        """Seconds until the nearest scheduled destruction or cleanup job"""
+        next_run = min(job[0] for job in self._cleanup_jobs)
+        with self._lock:
+            if self._destruction_heap:
+                next_run = min(next_run, self._destruction_heap[0][0])
+        return max(0, (next_run - datetime.utcnow()).total_seconds())
+    
+    def _run_due_cleanups(self):
+        """Run each cleanup job whose time has come and schedule its next run"""
+        current_time = datetime.utcnow()
+        for job in self._cleanup_jobs:
+            next_run, interval, task = job
+            if next_run > current_time:
+                continue
+            task()
+            # Skip runs missed while the loop was busy rather than replaying them
+            job[0] = next_run + interval
+            if job[0] <= current_time:
+                job[0] = current_time + interval
     
     def _check_scheduled_destructions(self):
         """Check for messages that need to be destroyed"""
         try:
             current_time = datetime.utcnow()
-            messages_to_destroy = []
             
-            # Check scheduled messages
-            for message_id, task in self.scheduled_messages.items():
-                if task['destruct_at'] <= current_time and task['status'] == 'scheduled':
-                    messages_to_destroy.append(message_id)
+            # Peek without the lock: only this thread pops, so the head can only move
+            # earlier, and a push racing the peek wakes the loop again anyway
+            heap = self._destruction_heap
+            if not heap or heap[0][0] > current_time:
+                return
             
-            # Destroy messages
-            for message_id in messages_to_destroy:
-                self._destroy_message(message_id)
+            # Pop only what is due; entries leave the schedule before destruction so a
+            # failed one can't keep the deadline in the past (the expired cleanup retries it)
+            tasks_to_destroy = []
+            with self._lock:
+                while self._destruction_heap and self._destruction_heap[0][0] <= current_time:
+                    destruct_at, message_id = heapq.heappop(self._destruction_heap)
+                    task = self.scheduled_messages.get(message_id)
+                    if task is None or task.destruct_at != destruct_at or task.status != 'scheduled':
+                        continue  # cancelled or rescheduled
+                    del self.scheduled_messages[message_id]
+                    tasks_to_destroy.append(task)
+            
+            # Destroy outside the lock; this is database work
+            for task in tasks_to_destroy:
+                self._destroy_message(task)
                 
-        except Exception as e:
-            print(f"Error checking scheduled destructions: {e}")
+        except Exception:
+            logger.exception("Error checking scheduled destructions")
     
-    def _destroy_message(self, message_id: str):
+    def _destroy_message(self, task: DestructionTask):
         """Securely destroy a message"""
+        message_id = task.message_id
         try:
-            # Get message from database
-            message = self.db.get_message_by_id(message_id)
-            if not message:
-                print(f"Message {message_id} not found for destruction")
-                return
+            # Claim the message; a miss means it is gone or another instance claimed it first
+            current_time = datetime.utcnow()
+            claim_query = {'_id': ObjectId(message_id), 'is_deleted': False, **self._claim_filter(current_time)}
+            claim = {'$set': {'claimed_by': self.instance_id, 'claim_expires_at': current_time + self.CLAIM_LEASE}}
+            message = task.message
+            if message is not None:
+                if self._msgs.update_one(claim_query, claim).matched_count == 0:
+                    return
+            else:
+                # Nothing cached for this task, so read the fields back with the claim
+                message = self._msgs.find_one_and_update(
+                    claim_query, claim, projection=self.DESTRUCTION_FIELDS
+                )
+                if not message:
+                    return
             
             # Destroy encryption key
             if message.get('session_key'):
                 self.encryption_manager.destroy_key(message['session_key'])
             
-            # Mark message as deleted in database
-            self.db.delete_message(message_id)
-            
-            # Remove from scheduled messages
-            if message_id in self.scheduled_messages:
-                self.scheduled_messages[message_id]['status'] = 'destroyed'
-                del self.scheduled_messages[message_id]
+            # Mark message as deleted in database; a miss means the expired cleanup got it first
+            result = self._msgs.update_one(
+                {'_id': ObjectId(message_id), 'is_deleted': False},
+                {'$set': {'is_deleted': True, 'deleted_at': current_time}}
+            )
+            if result.modified_count == 0:
+                return
             
-            # Log destruction
-            self._log_message_destruction(message_id, message)
+            # Log destruction; only a logged message is handed to the destroyed_at TTL index
+            if self._log_message_destruction(message_id, message):
+                self._msgs.update_one({'_id': ObjectId(message_id)}, {'$set': {'destroyed_at': current_time}})
             
-            print(f"Message {message_id} destroyed successfully")
+            logger.debug("Message %s destroyed successfully", message_id)
             
-        except Exception as e:
-            print(f"Error destroying message {message_id}: {e}")
+        except Exception:
+            logger.exception("Error destroying message %s", message_id)
     
-    def _log_message_destruction(self, message_id: str, message: Dict):
-        """Log message destruction event"""
+    def _log_message_destruction(self, message_id: str, message: Dict) -> bool:
+        """Log message destruction event; returns whether the entry was written"""
         try:
-            log_entry = {
-                'event_type': 'message_destruction',
-                'message_id': message_id,
-                'sender_id': message.get('sender_id'),
-                'recipient_id': message.get('recipient_id'),
-                'destruction_reason': 'scheduled_self_destruct',
-                'timestamp': datetime.utcnow(),
-                'metadata': {
-                    'self_destruct_time': message.get('self_destruct_time'),
-                    'read_once': message.get('read_once'),
-                    'message_length': len(message.get('content', ''))
-                }
-            }
-            
             # Store in system logs collection
-            self.db.db.system_logs.insert_one(log_entry)
+            self._syslogs.insert_one(
+                self._destruction_log_entry(message_id, message, datetime.utcnow())
+            )
+            return True
             
-        except Exception as e:
-            print(f"Error logging message destruction: {e}")
+        except Exception:
+            logger.exception("Error logging message destruction")
+            return False
+    
+    def _destruction_log_entry(self, message_id: str, message: Dict, timestamp: datetime) -> Dict:
+        """Build the system log entry for a destroyed message"""
+        return {
+            'event_type': 'message_destruction',
+            'message_id': message_id,
+            'sender_id': message.get('sender_id'),
+            'recipient_id': message.get('recipient_id'),
+            'destruction_reason': 'scheduled_self_destruct',
+            'timestamp': timestamp,
+            'metadata': {
+                'self_destruct_time': message.get('self_destruct_time'),
+                'read_once': message.get('read_once'),
+                'message_length': message.get('content_length', len(message.get('content', '')))
+            }
+        }
     
     def _cleanup_expired_messages(self):
         """Clean up expired self-destruct messages"""
+        # A run already in progress will handle everything this one would
+        if not self._cleanup_in_progress.acquire(blocking=False):
+            return
         try:
             current_time = datetime.utcnow()
             
-            # Find expired messages
-            expired_messages = list(self.db.db.messages.find({
-                'destruct_at': {'$lt': current_time},
-                'is_deleted': False
-            }))
-            
-            destroyed_count = 0
-            for message in expired_messages:
-                try:
-                    # Destroy encryption key
-                    if message.get('session_key'):
-                        self.encryption_manager.destroy_key(message['session_key'])
-                    
-                    # Mark as deleted
-                    self.db.db.messages.update_one(
-                        {'_id': message['_id']},
-                        {'$set': {'is_deleted': True, 'deleted_at': current_time}}
+            # Find expired messages, returning the ciphertext's length instead of the ciphertext
+            expired_messages = list(self._msgs.aggregate([
+                {'$match': {
+                    'destruct_at': {'$lt': current_time},
+                    'is_deleted': False,
+                    **self._claim_filter(current_time)
+                }},
+                {'$project': self.DESTRUCTION_FIELDS}
+            ], maxTimeMS=self.QUERY_MAX_TIME_MS))
+            if not expired_messages:
+                return
+            
+            # Mark them all deleted in one write; matching on the fetched IDs keeps
+            # messages that expire in between for the next run, when they'll be logged
+            expired_ids = [message['_id'] for message in expired_messages]
+            result = self._msgs.update_many(
+                {'_id': {'$in': expired_ids}, 'is_deleted': False, **self._claim_filter(current_time)},
+                {'$set': {'is_deleted': True, 'deleted_at': current_time, 'claimed_by': self.instance_id}}
+            )
+            if result.modified_count == 0:
+                return
+            
+            # Another instance or the destruction loop may have deleted some in between;
+            # only the ones this write deleted are destroyed and logged here
+            if result.modified_count < len(expired_messages):
+                deleted_ids = {
+                    message['_id'] for message in self._msgs.find(
+                        {'_id': {'$in': expired_ids}, 'claimed_by': self.instance_id, 'deleted_at': current_time},
+                        {'_id': 1}
                     )
-                    
-                    # Log destruction
-                    self._log_message_destruction(str(message['_id']), message)
-                    
-                    destroyed_count += 1
-                    
-                except Exception as e:
-                    print(f"Error destroying expired message {message['_id']}: {e}")
+                }
+                expired_messages = [message for message in expired_messages if message['_id'] in deleted_ids]
+            
+            # Destroy encryption keys
+            self.encryption_manager.destroy_keys(
+                message['session_key'] for message in expired_messages if message.get('session_key')
+            )
             
-            if destroyed_count > 0:
-                print(f"Cleaned up {destroyed_count} expired messages")
+            # Log destructions in one insert
+            self._syslogs.insert_many(
+                [
+                    self._destruction_log_entry(str(message['_id']), message, current_time)
+                    for message in expired_messages
+                ],
+                ordered=False
+            )
+            
+            # Logged, so the destroyed_at TTL index may now remove them after the grace period
+            self._msgs.update_many(
+                {'_id': {'$in': [message['_id'] for message in expired_messages]}},
+                {'$set': {'destroyed_at': current_time}}
+            )
+            
+            logger.info("Cleaned up %d expired messages", result.modified_count)
                 
-        except Exception as e:
-            print(f"Error cleaning up expired messages: {e}")
+        except Exception:
+            logger.exception("Error cleaning up expired messages")
+        finally:
+            self._cleanup_in_progress.release()
     
     def _cleanup_expired_keys(self):
         """Clean up expired session keys"""
         try:
             current_time = datetime.utcnow()
             
-            # Find expired keys
-            expired_keys = list(self.db.db.session_keys.find({
-                'expires_at': {'$lt': current_time},
-                'is_destroyed': False
-            }))
-            
-            destroyed_count = 0
-            for key in expired_keys:
-                try:
-                    # Mark as destroyed
-                    self.db.db.session_keys.update_one(
-                        {'_id': key['_id']},
-                        {'$set': {'is_destroyed': True, 'destroyed_at': current_time}}
-                    )
-                    
-                    destroyed_count += 1
-                    
-                except Exception as e:
-                    print(f"Error destroying expired key {key['_id']}: {e}")
+            # Mark expired keys destroyed in one write
+            result = self._keys.update_many(
+                {'expires_at': {'$lt': current_time}, 'is_destroyed': False},
+                {'$set': {'is_destroyed': True, 'destroyed_at': current_time}}
+            )
             
-            if destroyed_count > 0:
-                print(f"Cleaned up {destroyed_count} expired session keys")
+            if result.modified_count > 0:
+                logger.info("Cleaned up %d expired session keys", result.modified_count)
                 
-        except Exception as e:
-            print(f"Error cleaning up expired keys: {e}")
+        except Exception:
+            logger.exception("Error cleaning up expired keys")
+    
+    def _delete_in_batches(self, collection, query: Dict) -> int:
+        """Delete matching documents a batch at a time so writers aren't stalled"""
+        deleted_count = 0
+        while True:
+            # The query is served from its timestamp index, which no longer holds the
+            # batches already deleted, so each lookup starts at the next live match
+            ids = [doc['_id'] for doc in collection.find(query, {'_id': 1}).limit(self.RETENTION_DELETE_BATCH)]
+            if not ids:
+                return deleted_count
+            deleted_count += collection.delete_many({'_id': {'$in': ids}}).deleted_count
+            if len(ids) < self.RETENTION_DELETE_BATCH:
+                return deleted_count
+            time.sleep(self.RETENTION_DELETE_PAUSE)
     
     def _cleanup_old_threat_logs(self):
         """Clean up old threat logs (older than 30 days)"""
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=30)
             
-            result = self.db.db.threat_logs.delete_many({
+            deleted_count = self._delete_in_batches(self._threats, {
                 'timestamp': {'$lt': cutoff_date},
                 'is_resolved': True
             })
             
-            if result.deleted_count > 0:
-                print(f"Cleaned up {result.deleted_count} old threat logs")
+            if deleted_count > 0:
+                logger.info("Cleaned up %d old threat logs", deleted_count)
                 
-        except Exception as e:
-            print(f"Error cleaning up old threat logs: {e}")
+        except Exception:
+            logger.exception("Error cleaning up old threat logs")
     
     def _cleanup_old_system_logs(self):
         """Clean up old system logs (older than 7 days)"""
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=7)
             
-            result = self.db.db.system_logs.delete_many({
+            deleted_count = self._delete_in_batches(self._syslogs, {
                 'timestamp': {'$lt': cutoff_date}
             })
             
-            if result.deleted_count > 0:
-                print(f"Cleaned up {result.deleted_count} old system logs")
+            if deleted_count > 0:
+                logger.info("Cleaned up %d old system logs", deleted_count)
                 
-        except Exception as e:
-            print(f"Error cleaning up old system logs: {e}")
+        except Exception:
+            logger.exception("Error cleaning up old system logs")
     
     def get_scheduled_messages(self) -> List[Dict]:
         """Get list of scheduled messages"""
         try:
+            with self._lock:
+                tasks = list(self.scheduled_messages.items())
+            
             scheduled = []
-            for message_id, task in self.scheduled_messages.items():
+            for message_id, task in tasks:
                 scheduled.append({
                     'message_id': message_id,
-                    'destruct_at': task['destruct_at'].isoformat(),
-                    'read_once': task['read_once'],
-                    'status': task['status'],
-                    'created_at': task['created_at'].isoformat()
+                    'destruct_at': task.destruct_at.isoformat(),
+                    'read_once': task.read_once,
+                    'status': task.status,
+                    'created_at': task.created_at.isoformat()
                 })
             
             return scheduled
             
-        except Exception as e:
-            print(f"Error getting scheduled messages: {e}")
+        except Exception:
+            logger.exception("Error getting scheduled messages")
             return []
     
     def get_cleanup_statistics(self) -> Dict:
@@ -358,13 +517,13 @@ class MessageScheduler:
             current_time = datetime.utcnow()
             
             # Count expired messages
-            expired_messages = self.db.db.messages.count_documents({
+            expired_messages = self._msgs.count_documents({
                 'destruct_at': {'$lt': current_time},
                 'is_deleted': False
             })
             
             # Count expired keys
-            expired_keys = self.db.db.session_keys.count_documents({
+            expired_keys = self._keys.count_documents({
                 'expires_at': {'$lt': current_time},
                 'is_destroyed': False
             })
@@ -381,13 +540,13 @@ class MessageScheduler:
             }
             
         except Exception as e:
-            print(f"Error getting cleanup statistics: {e}")
+            logger.exception("Error getting cleanup statistics")
             return {'error': str(e)}
     
     def force_cleanup(self):
         """Force immediate cleanup of all expired items"""
         try:
-            print("Starting forced cleanup...")
+            logger.info("Starting forced cleanup...")
             
             # Clean up expired messages
             self._cleanup_expired_messages()
@@ -399,46 +558,66 @@ class MessageScheduler:
             self._cleanup_old_threat_logs()
             self._cleanup_old_system_logs()
             
-            print("Forced cleanup completed")
+            logger.info("Forced cleanup completed")
             
-        except Exception as e:
-            print(f"Error in forced cleanup: {e}")
+        except Exception:
+            logger.exception("Error in forced cleanup")
     
     def schedule_bulk_destruction(self, message_ids: List[str], destruct_time: int):
         """Schedule multiple messages for destruction"""
         try:
-            for message_id in message_ids:
-                self.schedule_destruction(message_id, destruct_time)
+            if not message_ids:
+                return
             
-            print(f"Scheduled {len(message_ids)} messages for destruction")
+            # One destruction time and one timestamp for the whole batch
+            now = datetime.utcnow()
+            destruct_at = now + timedelta(seconds=destruct_time)
+            
+            # Update database in one round trip; a failed write raises before anything is cached
+            self._msgs.bulk_write(
+                [
+                    UpdateOne({'_id': ObjectId(message_id)}, {'$set': {'destruct_at': destruct_at}})
+                    for message_id in message_ids
+                ],
+                ordered=False
+            )
             
-        except Exception as e:
-            print(f"Error scheduling bulk destruction: {e}")
+            # Cache them locally only if this instance's loop is running and would load them anyway
+            if self.running and destruct_at < now + self.LOOKAHEAD:
+                with self._lock:
+                    for message_id in message_ids:
+                        self.scheduled_messages[message_id] = DestructionTask(message_id, destruct_at, False, now)
+                        heapq.heappush(self._destruction_heap, (destruct_at, message_id))
+                self._wake.set()
+            
+            logger.debug("Scheduled %d messages for destruction", len(message_ids))
+            
+        except Exception:
+            logger.exception("Error scheduling bulk destruction")
     
     def get_destruction_queue(self) -> List[Dict]:
         """Get messages in destruction queue"""
         try:
             current_time = datetime.utcnow()
             
-            # Get messages scheduled for destruction
-            queued_messages = list(self.db.db.messages.find({
-                'destruct_at': {'$gt': current_time},
-                'is_deleted': False
-            }).sort('destruct_at', 1))
-            
-            queue = []
-            for message in queued_messages:
-                queue.append({
-                    'message_id': str(message['_id']),
-                    'sender_id': message['sender_id'],
-                    'recipient_id': message['recipient_id'],
-                    'destruct_at': message['destruct_at'].isoformat(),
-                    'time_remaining': (message['destruct_at'] - current_time).total_seconds(),
-                    'read_once': message.get('read_once', False)
-                })
-            
-            return queue
-            
-        except Exception as e:
-            print(f"Error getting destruction queue: {e}")
+            # Get messages scheduled for destruction, shaped and timed by the server
+            return list(self._msgs.aggregate([
+                {'$match': {
+                    'destruct_at': {'$gt': current_time, '$lt': self.db.NEVER_DESTRUCT},
+                    'is_deleted': False
+                }},
+                {'$sort': {'destruct_at': 1}},
+                {'$project': {
+                    '_id': 0,
+                    'message_id': {'$toString': '$_id'},
+                    'sender_id': 1,
+                    'recipient_id': 1,
+                    'destruct_at': {'$dateToString': {'date': '$destruct_at', 'format': '%Y-%m-%dT%H:%M:%S.%L'}},
+                    'time_remaining': {'$divide': [{'$subtract': ['$destruct_at', current_time]}, 1000]},
+                    'read_once': {'$ifNull': ['$read_once', False]}
+                }}
+            ], maxTimeMS=self.QUERY_MAX_TIME_MS))
+            
+        except Exception:
+            logger.exception("Error getting destruction queue")
             return []
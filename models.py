@@ -3,288 +3,280 @@ TacticalLink Database Models
 Defines data structures for users, messages, and threat logs
 """
 
+from dataclasses import MISSING, dataclass, field, fields
+from functools import lru_cache
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import TYPE_CHECKING, Optional, Dict, Any
+import base64
 import bcrypt
 import secrets
 import string
+import sys
 
-class User:
-    """User model for authentication and encryption"""
+try:
+    import argon2
+except ImportError:
+    argon2 = None
+
+# bcrypt salt = cost prefix + 16 random bytes in bcrypt's base64 alphabet, as bcrypt.gensalt() builds it
+BCRYPT_SALT_PREFIX = b'$2b$12$'
+_BCRYPT_B64_TABLE = bytes.maketrans(
+    b'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/',
+    b'./ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789'
+)
+
+# New passwords are hashed with Argon2id when argon2-cffi is installed; its lanes hash in
+# parallel within one password. Hashes are self-describing, so bcrypt ones keep verifying
+ARGON2_PREFIX = '$argon2'
+_argon2_hasher = (
+    argon2.PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=4, type=argon2.Type.ID)
+    if argon2 is not None else None
+)
+
+JOIN_KEY_ALPHABET = string.ascii_uppercase + string.digits
+JOIN_KEY_LENGTH = 8
+_JOIN_KEY_CHARS = frozenset(JOIN_KEY_ALPHABET)
+
+def _bcrypt_salt() -> bytes:
+    """Generate a bcrypt salt with the precomputed cost prefix"""
+    return BCRYPT_SALT_PREFIX + base64.b64encode(secrets.token_bytes(16))[:22].translate(_BCRYPT_B64_TABLE)
+
+def hash_password(password: str):
+    """Hash a password with Argon2id when available, otherwise bcrypt"""
+    if _argon2_hasher is not None:
+        return _argon2_hasher.hash(password)
+    return bcrypt.hashpw(password.encode('utf-8'), _bcrypt_salt())
+
+def verify_password(password: str, password_hash) -> bool:
+    """Check a password against an Argon2 or bcrypt hash, picked by the hash's prefix"""
+    if isinstance(password_hash, str) and password_hash.startswith(ARGON2_PREFIX):
+        if _argon2_hasher is None:
+            raise RuntimeError("argon2-cffi is required to verify Argon2 password hashes")
+        try:
+            return _argon2_hasher.verify(password_hash, password)
+        except argon2.exceptions.VerificationError:
+            return False
+    if isinstance(password_hash, str):
+        password_hash = password_hash.encode('utf-8')
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash)
+
+@lru_cache(maxsize=64)
+def _seconds(seconds: int) -> timedelta:
+    """Shared timedelta for a self-destruct duration; clients pick from a handful of presets"""
+    return timedelta(seconds=seconds)
+
+# Default for a model's creation time, resolved to the current time when the model is first stored
+_NOW = object()
+
+def _intern_str(value):
+    """Intern a string value; other types pass through"""
+    return sys.intern(value) if type(value) is str else value
+
+def _model(cls):
+    """Make a model class a slotted dataclass and compile its to_dict and from_dict"""
+    # eq=False keeps identity equality and hashing, as the models had as plain classes
+    cls = dataclass(slots=True, eq=False)(cls)
+    cls._FIELDS = tuple(f.name for f in fields(cls))
+    
+    # Generated source spells out every field, so serializing is one dict display and
+    # loading is straight-line slot writes, with no per-field loop or lookups by name
+    namespace = {'_NOW': _NOW, '_utcnow': datetime.utcnow, '_intern_str': _intern_str}
+    now_field = cls._NOW_FIELD
+    to_dict_lines = [
+        'def to_dict(self):',
+        f'    if self.{now_field} is _NOW:',
+        f'        self.{now_field} = _utcnow()',
+        '    return {' + ', '.join(f'{name!r}: self.{name}' for name in cls._FIELDS) + '}'
+    ]
+    from_dict_lines = ['def from_dict(cls, data):', '    obj = cls.__new__(cls)']
+    for f in fields(cls):
+        name = f.name
+        value = f'data[{name!r}]'
+        if name in cls._INTERNED:
+            value = f'_intern_str({value})'
+        # Dataclass defaults double as from_dict defaults; factories are called for a fresh value
+        if f.default is not MISSING:
+            namespace[f'_default_{name}'] = f.default
+            value = f'{value} if {name!r} in data else _default_{name}'
+        elif f.default_factory is not MISSING:
+            namespace[f'_factory_{name}'] = f.default_factory
+            value = f'{value} if {name!r} in data else _factory_{name}()'
+        from_dict_lines.append(f'    obj.{name} = {value}')
+    from_dict_lines.append('    return obj')
+    exec('\n'.join(to_dict_lines + from_dict_lines) + '\n', namespace)
+    
+    to_dict = namespace['to_dict']
+    to_dict.__qualname__ = f'{cls.__name__}.to_dict'
+    to_dict.__doc__ = "Convert to dictionary for database storage"
+    from_dict = namespace['from_dict']
+    from_dict.__qualname__ = f'{cls.__name__}.from_dict'
+    from_dict.__doc__ = "Create an instance from a stored dictionary, without running __init__"
+    cls.to_dict = to_dict
+    cls.from_dict = classmethod(from_dict)
+    return cls
+
+class _Model:
+    """Base for models stored as their dataclass fields"""
+    
+    __slots__ = ()
+    # Creation-time field, which may hold _NOW until to_dict
+    _NOW_FIELD = 'created_at'
+    # Low-cardinality string fields, interned by from_dict so repeats share one object
+    _INTERNED = frozenset()
     
-    def __init__(self, username: str, email: str, is_admin: bool = False):
-        self.username = username
-        self.email = email
-        self.is_admin = is_admin
-        self.created_at = datetime.utcnow()
-        self.last_login = None
-        self.public_key = None
-        self.private_key = None
-        self.password_hash = None
-        self.is_active = True
+    # Both are compiled per class by _model; declared here only for type checkers
+    if TYPE_CHECKING:
+        def to_dict(self) -> Dict[str, Any]: ...
         
+        @classmethod
+        def from_dict(cls, data: Dict[str, Any]): ...
+
+@_model
+class User(_Model):
+    """User model for authentication and encryption"""
+    
+    username: str
+    email: str
+    is_admin: bool = False
+    created_at: datetime = field(default=_NOW, init=False)
+    last_login: Optional[datetime] = field(default=None, init=False)
+    public_key: Optional[str] = field(default=None, init=False)
+    private_key: Optional[str] = field(default=None, init=False, repr=False)
+    password_hash: Optional[Any] = field(default=None, init=False, repr=False)
+    is_active: bool = field(default=True, init=False)
+    
     def set_password(self, password: str):
         """Hash and store password"""
-        salt = bcrypt.gensalt()
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), salt)
+        self.password_hash = hash_password(password)
     
     def check_password(self, password: str) -> bool:
         """Verify password"""
         if not self.password_hash:
             return False
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash)
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for database storage"""
-        return {
-            'username': self.username,
-            'email': self.email,
-            'is_admin': self.is_admin,
-            'created_at': self.created_at,
-            'last_login': self.last_login,
-            'public_key': self.public_key,
-            'private_key': self.private_key,
-            'password_hash': self.password_hash,
-            'is_active': self.is_active
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'User':
-        """Create User instance from dictionary"""
-        user = cls(data['username'], data['email'], data.get('is_admin', False))
-        user.created_at = data.get('created_at', datetime.utcnow())
-        user.last_login = data.get('last_login')
-        user.public_key = data.get('public_key')
-        user.private_key = data.get('private_key')
-        user.password_hash = data.get('password_hash')
-        user.is_active = data.get('is_active', True)
-        return user
+        return verify_password(password, self.password_hash)
 
-class Message:
+@_model
+class Message(_Model):
     """Message model for encrypted communication"""
     
-    def __init__(self, sender_id: str, recipient_id: str, content: str, 
-                 session_key: str, self_destruct_time: int = 0, 
-                 read_once: bool = False, timestamp: Optional[datetime] = None,
-                 original_content: str = None):
-        self.sender_id = sender_id
-        self.recipient_id = recipient_id
-        self.content = content  # Encrypted content
-        self.original_content = original_content  # Original content for sender
-        self.session_key = session_key  # Encrypted session key
-        self.self_destruct_time = self_destruct_time  # Seconds until self-destruct
-        self.read_once = read_once  # Delete after first read
-        self.timestamp = timestamp or datetime.utcnow()
-        self.is_read = False
-        self.is_deleted = False
-        self.destruct_at = None
-        
-        # Calculate destruction time if specified
-        if self_destruct_time > 0:
-            self.destruct_at = self.timestamp + timedelta(seconds=self_destruct_time)
+    _NOW_FIELD = 'timestamp'
+    _INTERNED = frozenset(('sender_id', 'recipient_id'))
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for database storage"""
-        return {
-            'sender_id': self.sender_id,
-            'recipient_id': self.recipient_id,
-            'content': self.content,
-            'original_content': self.original_content,
-            'session_key': self.session_key,
-            'self_destruct_time': self.self_destruct_time,
-            'read_once': self.read_once,
-            'timestamp': self.timestamp,
-            'is_read': self.is_read,
-            'is_deleted': self.is_deleted,
-            'destruct_at': self.destruct_at
-        }
+    sender_id: str
+    recipient_id: str
+    content: str  # Encrypted content
+    session_key: str  # Encrypted session key
+    self_destruct_time: int = 0  # Seconds until self-destruct
+    read_once: bool = False  # Delete after first read
+    timestamp: Optional[datetime] = _NOW
+    original_content: Optional[str] = None  # Original content for sender
+    is_read: bool = field(default=False, init=False)
+    is_deleted: bool = field(default=False, init=False)
+    destruct_at: Optional[datetime] = field(default=None, init=False)
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Message':
-        """Create Message instance from dictionary"""
-        message = cls(
-            data['sender_id'],
-            data['recipient_id'],
-            data['content'],
-            data['session_key'],
-            data.get('self_destruct_time', 0),
-            data.get('read_once', False),
-            data.get('timestamp', datetime.utcnow()),
-            data.get('original_content')
-        )
-        message.is_read = data.get('is_read', False)
-        message.is_deleted = data.get('is_deleted', False)
-        message.destruct_at = data.get('destruct_at')
-        return message
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = _NOW
+        
+        # Calculate destruction time if specified; this needs the timestamp now
+        if self.self_destruct_time > 0:
+            if self.timestamp is _NOW:
+                self.timestamp = datetime.utcnow()
+            self.destruct_at = self.timestamp + _seconds(self.self_destruct_time)
 
-class ThreatLog:
+@_model
+class ThreatLog(_Model):
     """Threat detection log model"""
     
-    def __init__(self, user_id: str, threat_score: float, reason: str, 
-                 timestamp: Optional[datetime] = None, metadata: Optional[Dict] = None):
-        self.user_id = user_id
-        self.threat_score = threat_score
-        self.reason = reason
-        self.timestamp = timestamp or datetime.utcnow()
-        self.metadata = metadata or {}
-        self.is_resolved = False
-        self.resolved_at = None
-        self.resolved_by = None
+    _NOW_FIELD = 'timestamp'
+    _INTERNED = frozenset(('user_id',))
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for database storage"""
-        return {
-            'user_id': self.user_id,
-            'threat_score': self.threat_score,
-            'reason': self.reason,
-            'timestamp': self.timestamp,
-            'metadata': self.metadata,
-            'is_resolved': self.is_resolved,
-            'resolved_at': self.resolved_at,
-            'resolved_by': self.resolved_by
-        }
+    user_id: str
+    threat_score: float
+    reason: str
+    timestamp: Optional[datetime] = _NOW
+    metadata: Optional[Dict] = field(default_factory=dict)
+    is_resolved: bool = field(default=False, init=False)
+    resolved_at: Optional[datetime] = field(default=None, init=False)
+    resolved_by: Optional[str] = field(default=None, init=False)
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'ThreatLog':
-        """Create ThreatLog instance from dictionary"""
-        threat_log = cls(
-            data['user_id'],
-            data['threat_score'],
-            data['reason'],
-            data.get('timestamp', datetime.utcnow()),
-            data.get('metadata', {})
-        )
-        threat_log.is_resolved = data.get('is_resolved', False)
-        threat_log.resolved_at = data.get('resolved_at')
-        threat_log.resolved_by = data.get('resolved_by')
-        return threat_log
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = _NOW
+        if self.metadata is None:
+            self.metadata = {}
 
-class SessionKey:
+@_model
+class SessionKey(_Model):
     """Session key model for temporary encryption keys"""
     
-    def __init__(self, key_id: str, encrypted_key: str, 
-                 created_at: Optional[datetime] = None, expires_at: Optional[datetime] = None):
-        self.key_id = key_id
-        self.encrypted_key = encrypted_key
-        self.created_at = created_at or datetime.utcnow()
-        self.expires_at = expires_at
-        self.is_destroyed = False
-        self.destroyed_at = None
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for database storage"""
-        return {
-            'key_id': self.key_id,
-            'encrypted_key': self.encrypted_key,
-            'created_at': self.created_at,
-            'expires_at': self.expires_at,
-            'is_destroyed': self.is_destroyed,
-            'destroyed_at': self.destroyed_at
-        }
+    key_id: str
+    encrypted_key: str
+    created_at: Optional[datetime] = _NOW
+    expires_at: Optional[datetime] = None
+    is_destroyed: bool = field(default=False, init=False)
+    destroyed_at: Optional[datetime] = field(default=None, init=False)
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'SessionKey':
-        """Create SessionKey instance from dictionary"""
-        session_key = cls(
-            data['key_id'],
-            data['encrypted_key'],
-            data.get('created_at', datetime.utcnow()),
-            data.get('expires_at')
-        )
-        session_key.is_destroyed = data.get('is_destroyed', False)
-        session_key.destroyed_at = data.get('destroyed_at')
-        return session_key
+    def __post_init__(self):
+        if self.created_at is None:
+            self.created_at = _NOW
 
-class ChatRoom:
+@_model
+class ChatRoom(_Model):
     """Chat room model for group messaging"""
     
-    def __init__(self, name: str, description: str = "", created_by: str = "", 
-                 is_public: bool = True, max_members: int = 50, join_key: str = None):
-        self.name = name
-        self.description = description
-        self.created_by = created_by
-        self.is_public = is_public
-        self.max_members = max_members
-        self.members = [created_by] if created_by else []
-        self.created_at = datetime.utcnow()
-        self.is_active = True
+    _INTERNED = frozenset(('created_by',))
+    
+    name: str
+    description: str = ""
+    created_by: str = ""
+    is_public: bool = True
+    max_members: int = 50
+    members: list = field(default_factory=list, init=False)
+    created_at: datetime = field(default=_NOW, init=False)
+    is_active: bool = field(default=True, init=False)
+    join_key: Optional[str] = None
+    
+    def __post_init__(self):
+        if self.created_by:
+            self.members = [self.created_by]
         # Generate random join key if not provided (for private rooms)
-        self.join_key = join_key or self._generate_join_key()
+        if not self.join_key:
+            self.join_key = self._generate_join_key()
     
     def _generate_join_key(self) -> str:
         """Generate a random join key for private rooms"""
-        # Generate 8-character alphanumeric key
-        characters = string.ascii_uppercase + string.digits
-        return ''.join(secrets.choice(characters) for _ in range(8))
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for database storage"""
-        return {
-            'name': self.name,
-            'description': self.description,
-            'created_by': self.created_by,
-            'is_public': self.is_public,
-            'max_members': self.max_members,
-            'members': self.members,
-            'created_at': self.created_at,
-            'is_active': self.is_active,
-            'join_key': self.join_key
-        }
+        # Draw the whole 8-character alphanumeric key as one uniform number, then spell it in base 36
+        value = secrets.randbelow(len(JOIN_KEY_ALPHABET) ** JOIN_KEY_LENGTH)
+        characters = []
+        for _ in range(JOIN_KEY_LENGTH):
+            value, index = divmod(value, len(JOIN_KEY_ALPHABET))
+            characters.append(JOIN_KEY_ALPHABET[index])
+        return ''.join(characters)
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'ChatRoom':
-        """Create ChatRoom instance from dictionary"""
-        room = cls(
-            data['name'],
-            data.get('description', ''),
-            data.get('created_by', ''),
-            data.get('is_public', True),
-            data.get('max_members', 50),
-            data.get('join_key')
-        )
-        room.members = data.get('members', [])
-        room.created_at = data.get('created_at', datetime.utcnow())
-        room.is_active = data.get('is_active', True)
-        return room
+    @staticmethod
+    def is_valid_join_key(join_key: str) -> bool:
+        """Check that a join key has the generated form, before looking it up"""
+        return len(join_key) == JOIN_KEY_LENGTH and _JOIN_KEY_CHARS.issuperset(join_key)
 
-class GroupMessage:
+@_model
+class GroupMessage(_Model):
     """Group message model for chat room messages"""
     
-    def __init__(self, room_id: str, sender_id: str, content: str, 
-                 message_type: str = "text", timestamp: Optional[datetime] = None):
-        self.room_id = room_id
-        self.sender_id = sender_id
-        self.content = content
-        self.message_type = message_type  # text, image, file, etc.
-        self.timestamp = timestamp or datetime.utcnow()
-        self.is_deleted = False
-        self.deleted_at = None
+    _NOW_FIELD = 'timestamp'
+    _INTERNED = frozenset(('room_id', 'sender_id', 'message_type'))
     
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for database storage"""
-        return {
-            'room_id': self.room_id,
-            'sender_id': self.sender_id,
-            'content': self.content,
-            'message_type': self.message_type,
-            'timestamp': self.timestamp,
-            'is_deleted': self.is_deleted,
-            'deleted_at': self.deleted_at
-        }
+    room_id: str
+    sender_id: str
+    content: str
+    message_type: str = "text"  # text, image, file, etc.
+    timestamp: Optional[datetime] = _NOW
+    is_deleted: bool = field(default=False, init=False)
+    deleted_at: Optional[datetime] = field(default=None, init=False)
     
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'GroupMessage':
-        """Create GroupMessage instance from dictionary"""
-        message = cls(
-            data['room_id'],
-            data['sender_id'],
-            data['content'],
-            data.get('message_type', 'text'),
-            data.get('timestamp', datetime.utcnow())
-        )
-        message.is_deleted = data.get('is_deleted', False)
-        message.deleted_at = data.get('deleted_at')
-        return message
+    def __post_init__(self):
+        if self.timestamp is None:
+            self.timestamp = _NOW
 
 # Database Schema Documentation
 """
@@ -0,0 +1,156 @@
+"""
+TacticalLink Real-Time State
+Active users and live threat scores shared across server workers
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, List
+from dotenv import load_dotenv
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+class RealtimeState:
+    """Active users and threat scores, kept in Redis when REDIS_URL is set"""
+
+    ACTIVE_USERS_KEY = 'tactical_link:active_users'
+    THREAT_SCORES_KEY = 'tactical_link:threat_scores'
+    THREAT_EVENTS_KEY = 'tactical_link:threat_events'
+    LOCK_KEY_PREFIX = 'tactical_link:lock:'
+    MAX_LOCAL_EVENTS = 10000  # drop events rather than grow without a consumer
+    # Extend a lock's TTL only if this owner still holds it, as one atomic step
+    RENEW_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+    def __init__(self):
+        self.redis = None
+        self._renew_lock = None
+        redis_url = os.getenv('REDIS_URL')
+        if redis_url and redis is not None:
+            self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+            self._renew_lock = self.redis.register_script(self.RENEW_LOCK_SCRIPT)
+
+        # In-process fallback; only consistent within a single worker
+        self._lock = threading.Lock()
+        self._active_users = set()
+        self._threat_scores = {}
+        self._threat_events = queue.Queue(maxsize=self.MAX_LOCAL_EVENTS)
+        self._owner_id = uuid.uuid4().hex
+
+    def add_active_user(self, user_id: str):
+        """Mark a user as active"""
+        if self.redis is not None:
+            self.redis.sadd(self.ACTIVE_USERS_KEY, user_id)
+            return
+        with self._lock:
+            self._active_users.add(user_id)
+
+    def is_active(self, user_id: str) -> bool:
+        """Check whether a user is active"""
+        if self.redis is not None:
+            return bool(self.redis.sismember(self.ACTIVE_USERS_KEY, user_id))
+        return user_id in self._active_users
+
+    def get_active_users(self) -> List[str]:
+        """Get the ids of all active users"""
+        if self.redis is not None:
+            return list(self.redis.smembers(self.ACTIVE_USERS_KEY))
+        with self._lock:
+            return list(self._active_users)
+
+    def get_active_user_count(self) -> int:
+        """Get the number of active users"""
+        if self.redis is not None:
+            return self.redis.scard(self.ACTIVE_USERS_KEY)
+        return len(self._active_users)
+
+    def set_threat_score(self, user_id: str, threat_score: float):
+        """Store a user's latest threat score"""
+        if self.redis is not None:
+            self.redis.hset(self.THREAT_SCORES_KEY, user_id, float(threat_score))
+            return
+        with self._lock:
+            self._threat_scores[user_id] = threat_score
+
+    def get_threat_score(self, user_id: str, default: float = 0) -> float:
+        """Get a user's latest threat score"""
+        if self.redis is not None:
+            score = self.redis.hget(self.THREAT_SCORES_KEY, user_id)
+            return float(score) if score is not None else default
+        return self._threat_scores.get(user_id, default)
+
+    def get_threat_scores(self) -> Dict[str, float]:
+        """Get every user's latest threat score"""
+        if self.redis is not None:
+            return {
+                user_id: float(score)
+                for user_id, score in self.redis.hgetall(self.THREAT_SCORES_KEY).items()
+            }
+        with self._lock:
+            return dict(self._threat_scores)
+
+    def push_threat_event(self, event: Dict):
+        """Queue a sent message for the threat monitor"""
+        if self.redis is not None:
+            payload = dict(event, timestamp=event['timestamp'].isoformat())
+            self.redis.rpush(self.THREAT_EVENTS_KEY, json.dumps(payload))
+            return
+        try:
+            self._threat_events.put_nowait(event)
+        except queue.Full:
+            logger.warning("Threat event queue full (%d); dropping event from %s",
+                           self.MAX_LOCAL_EVENTS, event.get('sender_id'))
+
+    def pop_threat_events(self, max_batch: int = 50, timeout: int = 5) -> List[Dict]:
+        """Block up to timeout seconds for an event, then drain up to max_batch queued events"""
+        events = []
+        if self.redis is not None:
+            first = self.redis.blpop(self.THREAT_EVENTS_KEY, timeout=timeout)
+            if first is None:
+                return events
+            raw_events = [first[1]]
+            rest = self.redis.lpop(self.THREAT_EVENTS_KEY, max_batch - 1) if max_batch > 1 else None
+            raw_events.extend(rest or [])
+            for raw in raw_events:
+                event = json.loads(raw)
+                event['timestamp'] = datetime.fromisoformat(event['timestamp'])
+                events.append(event)
+            return events
+
+        try:
+            events.append(self._threat_events.get(timeout=timeout))
+        except queue.Empty:
+            return events
+        while len(events) < max_batch:
+            try:
+                events.append(self._threat_events.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def acquire_lock(self, name: str, ttl: int = 60) -> bool:
+        """Take or renew a named lock so only one process runs a singleton task"""
+        if self.redis is None:
+            # Without Redis there is nothing shared to coordinate with
+            return True
+        key = self.LOCK_KEY_PREFIX + name
+        if self.redis.set(key, self._owner_id, nx=True, ex=ttl):
+            return True
+        # A separate GET then EXPIRE could extend a lock another process took in between
+        return bool(self._renew_lock(keys=[key], args=[self._owner_id, ttl]))
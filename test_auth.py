@@ -16,12 +16,15 @@ TEST_USER = {
 
 def test_auth():
     """Test authentication flow"""
+    # One session for the whole run, so requests reuse a keep-alive connection
+    session = requests.Session()
+    
     print("🔐 Testing TacticalLink Authentication...")
     
     # Test 1: Health check
     print("\n1. Testing health check...")
     try:
-        response = requests.get(f"{BASE_URL}/")
+        response = session.get(f"{BASE_URL}/")
         if response.status_code == 200:
             print("✅ Health check passed")
         else:
@@ -34,7 +37,7 @@ def test_auth():
     # Test 2: Register user
     print("\n2. Testing user registration...")
     try:
-        response = requests.post(f"{BASE_URL}/auth/register", json=TEST_USER)
+        response = session.post(f"{BASE_URL}/auth/register", json=TEST_USER)
         if response.status_code == 201:
             print("✅ User registration successful")
             data = response.json()
@@ -51,7 +54,7 @@ def test_auth():
     print("\n3. Testing token verification...")
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        response = requests.get(f"{BASE_URL}/auth/verify", headers=headers)
+        response = session.get(f"{BASE_URL}/auth/verify", headers=headers)
         if response.status_code == 200:
             print("✅ Token verification successful")
             data = response.json()
@@ -71,7 +74,7 @@ def test_auth():
             "username": TEST_USER["username"],
             "password": TEST_USER["password"]
         }
-        response = requests.post(f"{BASE_URL}/auth/login", json=login_data)
+        response = session.post(f"{BASE_URL}/auth/login", json=login_data)
         if response.status_code == 200:
             print("✅ User login successful")
             data = response.json()
@@ -87,7 +90,7 @@ def test_auth():
     print("\n5. Testing new token verification...")
     try:
         headers = {"Authorization": f"Bearer {new_token}"}
-        response = requests.get(f"{BASE_URL}/auth/verify", headers=headers)
+        response = session.get(f"{BASE_URL}/auth/verify", headers=headers)
         if response.status_code == 200:
             print("✅ New token verification successful")
         else:
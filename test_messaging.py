@@ -5,6 +5,7 @@ Test script to verify TacticalLink messaging functionality
 
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 import time
 
 # Configuration
@@ -12,6 +13,9 @@ BASE_URL = "http://localhost:5000"
 
 def test_messaging():
     """Test messaging functionality"""
+    # One session for the whole run, so requests reuse a keep-alive connection
+    session = requests.Session()
+    
     print("💬 Testing TacticalLink Messaging...")
     
     # Test users
@@ -33,9 +37,15 @@ def test_messaging():
     
     # Create test users
     print("\n1. Creating test users...")
-    for user_data in users:
+    # Register them concurrently; each registration waits on server-side hashing and key generation
+    with ThreadPoolExecutor(max_workers=len(users)) as pool:
+        futures = [
+            pool.submit(session.post, f"{BASE_URL}/auth/register", json=user_data)
+            for user_data in users
+        ]
+    for user_data, future in zip(users, futures):
         try:
-            response = requests.post(f"{BASE_URL}/auth/register", json=user_data)
+            response = future.result()
             if response.status_code == 201:
                 print(f"✅ Created user: {user_data['username']}")
                 data = response.json()
@@ -65,7 +75,7 @@ def test_messaging():
             "self_destruct_time": 0,
             "read_once": False
         }
-        response = requests.post(f"{BASE_URL}/chat/send", json=message_data, headers=headers)
+        response = session.post(f"{BASE_URL}/chat/send", json=message_data, headers=headers)
         if response.status_code == 201:
             print("✅ Alice sent message to Bob")
             print(f"   Threat score: {response.json().get('threat_score', 'N/A')}")
@@ -78,7 +88,7 @@ def test_messaging():
     print("\n3. Testing message receiving...")
     try:
         headers = {"Authorization": f"Bearer {bob_token}"}
-        response = requests.get(f"{BASE_URL}/chat/receive", headers=headers)
+        response = session.get(f"{BASE_URL}/chat/receive", headers=headers)
         if response.status_code == 200:
             messages = response.json()['messages']
             print(f"✅ Bob received {len(messages)} message(s)")
@@ -93,7 +103,7 @@ def test_messaging():
     print("\n4. Testing conversation retrieval...")
     try:
         headers = {"Authorization": f"Bearer {alice_token}"}
-        response = requests.get(f"{BASE_URL}/chat/conversation/{bob_id}", headers=headers)
+        response = session.get(f"{BASE_URL}/chat/conversation/{bob_id}", headers=headers)
         if response.status_code == 200:
             messages = response.json()['messages']
             print(f"✅ Alice can see {len(messages)} message(s) in conversation with Bob")
@@ -114,7 +124,7 @@ def test_messaging():
             "self_destruct_time": 0,
             "read_once": True
         }
-        response = requests.post(f"{BASE_URL}/chat/send", json=message_data, headers=headers)
+        response = session.post(f"{BASE_URL}/chat/send", json=message_data, headers=headers)
         if response.status_code == 201:
             print("✅ Bob sent read-once message to Alice")
         else:
@@ -126,7 +136,7 @@ def test_messaging():
     print("\n6. Testing read-once message consumption...")
     try:
         headers = {"Authorization": f"Bearer {alice_token}"}
-        response = requests.get(f"{BASE_URL}/chat/receive", headers=headers)
+        response = session.get(f"{BASE_URL}/chat/receive", headers=headers)
         if response.status_code == 200:
             messages = response.json()['messages']
             print(f"✅ Alice received {len(messages)} message(s)")
@@ -142,7 +152,7 @@ def test_messaging():
     print("\n7. Verifying read-once message deletion...")
     try:
         headers = {"Authorization": f"Bearer {alice_token}"}
-        response = requests.get(f"{BASE_URL}/chat/receive", headers=headers)
+        response = session.get(f"{BASE_URL}/chat/receive", headers=headers)
         if response.status_code == 200:
             messages = response.json()['messages']
             print(f"✅ Alice now has {len(messages)} message(s) (read-once should be deleted)")
@@ -5,12 +5,16 @@ Test script to verify private chat room functionality with join keys
 
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 BASE_URL = "http://localhost:5000"
 
 def test_private_room_functionality():
     """Test private room creation and joining by key"""
+    # One session for the whole run, so requests reuse a keep-alive connection
+    session = requests.Session()
+    
     print("🔐 Testing Private Chat Room Functionality...")
     
     # Test users
@@ -31,9 +35,15 @@ def test_private_room_functionality():
     
     # Create test users
     print("\n1. Creating test users...")
-    for user_data in test_users:
+    # Register them concurrently; each registration waits on server-side hashing and key generation
+    with ThreadPoolExecutor(max_workers=len(test_users)) as pool:
+        futures = [
+            pool.submit(session.post, f"{BASE_URL}/auth/register", json=user_data)
+            for user_data in test_users
+        ]
+    for user_data, future in zip(test_users, futures):
         try:
-            response = requests.post(f"{BASE_URL}/auth/register", json=user_data)
+            response = future.result()
             if response.status_code == 201:
                 print(f"✅ Created user: {user_data['username']}")
                 tokens.append(response.json()['access_token'])
@@ -50,7 +60,7 @@ def test_private_room_functionality():
     print("\n2. Creating private room...")
     try:
         headers = {"Authorization": f"Bearer {tokens[0]}"}
-        response = requests.post(f"{BASE_URL}/chat/rooms", 
+        response = session.post(f"{BASE_URL}/chat/rooms", 
                                json={
                                    "name": "Secret Room",
                                    "description": "A private room for testing",
@@ -79,7 +89,7 @@ def test_private_room_functionality():
     print("\n3. Joining private room by key...")
     try:
         headers = {"Authorization": f"Bearer {tokens[1]}"}
-        response = requests.post(f"{BASE_URL}/chat/rooms/join-by-key",
+        response = session.post(f"{BASE_URL}/chat/rooms/join-by-key",
                                json={"join_key": join_key},
                                headers=headers)
         
@@ -98,7 +108,7 @@ def test_private_room_functionality():
     print("\n4. Testing invalid join key...")
     try:
         headers = {"Authorization": f"Bearer {tokens[1]}"}
-        response = requests.post(f"{BASE_URL}/chat/rooms/join-by-key",
+        response = session.post(f"{BASE_URL}/chat/rooms/join-by-key",
                                json={"join_key": "INVALID"},
                                headers=headers)
         
@@ -114,7 +124,7 @@ def test_private_room_functionality():
     print("\n5. Creating public room for comparison...")
     try:
         headers = {"Authorization": f"Bearer {tokens[0]}"}
-        response = requests.post(f"{BASE_URL}/chat/rooms", 
+        response = session.post(f"{BASE_URL}/chat/rooms", 
                                json={
                                    "name": "Public Room",
                                    "description": "A public room for testing",
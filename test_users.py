@@ -5,67 +5,106 @@ Test script to verify user creation and retrieval
 
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Configuration
 BASE_URL = "http://localhost:5000"
+REGISTER_URL = f"{BASE_URL}/auth/register"
+USERS_URL = f"{BASE_URL}/chat/users"
+REQUEST_TIMEOUT = (2, 10)  # (connect, read) seconds, so a stalled server fails the test instead of hanging it
+JSON_HEADERS = {"Content-Type": "application/json"}
+ROLES = ("User", "Admin")  # indexed by is_admin
+
+# Test users
+TEST_USERS = (
+    {
+        "username": "alice",
+        "email": "alice@example.com",
+        "password": "AlicePassword123!"
+    },
+    {
+        "username": "bob",
+        "email": "bob@example.com",
+        "password": "BobPassword123!"
+    },
+    {
+        "username": "charlie",
+        "email": "charlie@example.com",
+        "password": "CharliePassword123!"
+    }
+)
+
+# Registration bodies, encoded once at import rather than inside every request
+ENCODED_USERS = tuple(json.dumps(user_data).encode() for user_data in TEST_USERS)
 
 def test_user_creation_and_retrieval():
     """Test user creation and retrieval"""
+    # One session for the whole run, so requests reuse a keep-alive connection
+    session = requests.Session()
+    
     print("👥 Testing User Creation and Retrieval...")
     
-    # Test users
-    test_users = [
-        {
-            "username": "alice",
-            "email": "alice@example.com",
-            "password": "AlicePassword123!"
-        },
-        {
-            "username": "bob",
-            "email": "bob@example.com",
-            "password": "BobPassword123!"
-        },
-        {
-            "username": "charlie",
-            "email": "charlie@example.com",
-            "password": "CharliePassword123!"
-        }
-    ]
+    # Pool a connection per concurrent request; only idempotent calls are retried
+    session.mount("http://", HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=len(TEST_USERS),
+        max_retries=Retry(total=2, backoff_factor=0.1, status_forcelist=[502, 503, 504])
+    ))
     
-    tokens = []
+    # (username, Authorization header) for each user created, built once per token
+    auth_headers = []
     
-    # Create test users
+    # Create test users, registering them concurrently
     print("\n1. Creating test users...")
-    for user_data in test_users:
+    with ThreadPoolExecutor(max_workers=len(TEST_USERS)) as pool:
+        futures = [
+            pool.submit(
+                session.post, REGISTER_URL,
+                data=body, headers=JSON_HEADERS, timeout=REQUEST_TIMEOUT
+            )
+            for body in ENCODED_USERS
+        ]
+    for user_data, future in zip(TEST_USERS, futures):
         try:
-            response = requests.post(f"{BASE_URL}/auth/register", json=user_data)
+            response = future.result()
             if response.status_code == 201:
                 print(f"✅ Created user: {user_data['username']}")
-                tokens.append(response.json()['access_token'])
+                token = response.json()['access_token']
+                auth_headers.append((user_data['username'], {"Authorization": f"Bearer {token}"}))
             else:
                 print(f"❌ Failed to create user {user_data['username']}: {response.status_code} - {response.text}")
-        except Exception as e:
+        except (requests.RequestException, KeyError) as e:
             print(f"❌ Error creating user {user_data['username']}: {e}")
     
-    if not tokens:
+    if not auth_headers:
         print("❌ No users created, cannot test retrieval")
         return
     
-    # Test user retrieval
+    # Test user retrieval, fetching every user's view concurrently
     print("\n2. Testing user retrieval...")
-    for i, token in enumerate(tokens):
+    with ThreadPoolExecutor(max_workers=len(auth_headers)) as pool:
+        futures = [
+            pool.submit(
+                session.get, USERS_URL, params={"fields": "username,is_admin"},
+                headers=headers, timeout=REQUEST_TIMEOUT
+            )
+            for _, headers in auth_headers
+        ]
+    for (username, _), future in zip(auth_headers, futures):
         try:
-            headers = {"Authorization": f"Bearer {token}"}
-            response = requests.get(f"{BASE_URL}/chat/users", headers=headers)
+            response = future.result()
             if response.status_code == 200:
                 users = response.json()['users']
-                print(f"✅ User {test_users[i]['username']} can see {len(users)} other users:")
-                for user in users:
-                    print(f"   - {user['username']} ({'Admin' if user.get('is_admin') else 'User'})")
+                # One print per user report rather than one per listed user
+                print("\n".join([f"✅ User {username} can see {len(users)} other users:"] + [
+                    f"   - {user['username']} ({ROLES[bool(user.get('is_admin'))]})" for user in users
+                ]))
             else:
-                print(f"❌ Failed to get users for {test_users[i]['username']}: {response.status_code} - {response.text}")
-        except Exception as e:
-            print(f"❌ Error getting users for {test_users[i]['username']}: {e}")
+                print(f"❌ Failed to get users for {username}: {response.status_code} - {response.text}")
+        except (requests.RequestException, KeyError) as e:
+            print(f"❌ Error getting users for {username}: {e}")
     
     print("\n🎉 User creation and retrieval test completed!")
     print("Now you should be able to see other users in the chat interface.")
@@ -0,0 +1,48 @@
+"""
+TacticalLink Background Worker
+Runs threat monitoring and the message scheduler in a single dedicated process
+"""
+
+import logging
+import signal
+import sys
+import threading
+import time
+
+from app import threat_monitoring_task, message_scheduler, realtime_state
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'background_worker'
+LOCK_TTL = 60  # seconds; renewed every third of that while running
+
+def main():
+    """Wait for leadership, run the background tasks, and exit if leadership is lost"""
+    # Exit through SystemExit on SIGTERM so atexit flushes queued threat logs
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
+    # Without Redis, threat events never leave the web processes and every worker would
+    # win the lock, so a separate worker can only do harm
+    if realtime_state.redis is None:
+        logger.error("REDIS_URL is not set; the background worker needs Redis "
+                     "(web processes run threat monitoring themselves without it)")
+        sys.exit(1)
+    
+    while not realtime_state.acquire_lock(LOCK_NAME, LOCK_TTL):
+        time.sleep(LOCK_TTL / 3)
+    logger.info("Background worker acquired leadership")
+    
+    threat_thread = threading.Thread(target=threat_monitoring_task, daemon=True)
+    threat_thread.start()
+    message_scheduler.start()
+    
+    while realtime_state.acquire_lock(LOCK_NAME, LOCK_TTL):
+        time.sleep(LOCK_TTL / 3)
+    
+    # Another process took over; stop so a supervisor can restart this one as standby
+    logger.info("Background worker lost leadership, exiting")
+    message_scheduler.stop()
+    sys.exit(1)
+
+if __name__ == '__main__':
+    main()